@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+
+class Samples:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+
+    def add(self, elapsed: float, ok: bool) -> None:
+        self.latencies.append(elapsed)
+        if not ok:
+            self.errors += 1
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: dict[str, Samples], duration: float) -> dict[str, dict]:
+    result = {}
+    for name, s in sorted(samples.items()):
+        values = sorted(s.latencies)
+        result[name] = {
+            "count": len(values),
+            "errors": s.errors,
+            "rps": round(len(values) / duration, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    return result
+
+
+def print_table(endpoints: dict[str, dict]) -> None:
+    header = f"{'endpoint':<42} {'count':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, e in endpoints.items():
+        print(f"{name:<42} {e['count']:>7} {e['errors']:>5} {e['rps']:>9.1f} "
+              f"{e['p50_ms']:>9.2f} {e['p95_ms']:>9.2f} {e['p99_ms']:>9.2f}")
+
+
+def save(path: Path, result: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    regressions = []
+    print(f"\n{'endpoint':<42} {'metric':>7} {'baseline':>10} {'current':>10} {'delta':>8}")
+    for name, cur in current["endpoints"].items():
+        base = baseline["endpoints"].get(name)
+        if base is None:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            before, after = base[metric], cur[metric]
+            delta = (after - before) / before * 100 if before else 0.0
+            print(f"{name:<42} {metric:>7} {before:>10.2f} {after:>10.2f} {delta:>+7.1f}%")
+            worse = -delta if metric == "rps" else delta
+            if metric in ("rps", "p95_ms") and worse > threshold:
+                regressions.append(f"{name} {metric}: {before:.2f} -> {after:.2f} ({delta:+.1f}%)")
+    return regressions
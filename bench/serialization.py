@@ -0,0 +1,144 @@
+import argparse
+import json
+import sys
+import timeit
+import uuid
+
+from pydantic import TypeAdapter
+
+from .run import ROOT
+
+sys.path.insert(0, str(ROOT / "gateway"))
+
+from app.models import (  # noqa: E402
+    HotelInfo, HotelResponse, LoyaltyInfoResponse, PaginationResponse, PaymentInfo, ReservationResponse,
+    UserInfoResponse,
+)
+from app.responses import FastJSONResponse, orjson  # noqa: E402
+from app.utils import build_hotel_item, build_loyalty_info, build_reservation_info  # noqa: E402
+
+
+def hotels_page(size: int) -> dict:
+    return {
+        "total": 1000,
+        "items": [
+            {
+                "hotelUid": str(uuid.uuid4()),
+                "name": f"Hotel {i}",
+                "country": "Россия",
+                "city": "Москва",
+                "address": f"ул. Тестовая, {i}",
+                "stars": 1 + i % 5,
+                "price": 1000 + i,
+            }
+            for i in range(size)
+        ],
+    }
+
+
+def reservations(count: int) -> tuple[list[dict], dict[str, dict]]:
+    items, payments = [], {}
+    for i in range(count):
+        payment_uid = str(uuid.uuid4())
+        payments[payment_uid] = {"paymentUid": payment_uid, "status": "PAID", "price": 1000 + i}
+        items.append({
+            "reservationUid": str(uuid.uuid4()),
+            "paymentUid": payment_uid,
+            "hotel": {"hotelUid": str(uuid.uuid4()), "name": f"Hotel {i}", "fullAddress": "Россия, Москва", "stars": 5},
+            "startDate": "2030-01-01",
+            "endDate": "2030-01-05",
+            "status": "PAID",
+        })
+    return items, payments
+
+
+def fastapi_render(adapter: TypeAdapter, value) -> bytes:
+    validated = adapter.validate_python(value, from_attributes=True)
+    return json.dumps(
+        adapter.dump_python(validated, mode="json"),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def model_hotels(data: dict, size: int) -> bytes:
+    page = PaginationResponse(
+        page=1,
+        pageSize=size,
+        totalElements=data["total"],
+        items=[HotelResponse(**h) for h in data["items"]],
+        nextCursor=None,
+    )
+    return fastapi_render(TypeAdapter(PaginationResponse), page)
+
+
+def fast_hotels(data: dict, size: int) -> bytes:
+    return FastJSONResponse({
+        "page": 1,
+        "pageSize": size,
+        "totalElements": data["total"],
+        "items": [build_hotel_item(h) for h in data["items"]],
+        "nextCursor": None,
+    }).body
+
+
+def model_me(items: list[dict], payments: dict, loyalty: dict) -> bytes:
+    info = UserInfoResponse(
+        reservations=[
+            ReservationResponse(
+                reservationUid=r["reservationUid"],
+                hotel=HotelInfo(**r["hotel"]),
+                startDate=r["startDate"],
+                endDate=r["endDate"],
+                status=r["status"],
+                payment=PaymentInfo(**{k: payments[r["paymentUid"]][k] for k in ("status", "price")}),
+            )
+            for r in items
+        ],
+        loyalty=LoyaltyInfoResponse(**loyalty),
+    )
+    return fastapi_render(TypeAdapter(UserInfoResponse), info)
+
+
+def fast_me(items: list[dict], payments: dict, loyalty: dict) -> bytes:
+    return FastJSONResponse({
+        "reservations": [build_reservation_info(r, payments[r["paymentUid"]]) for r in items],
+        "loyalty": build_loyalty_info(loyalty),
+        "degraded": [],
+    }).body
+
+
+def measure(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.serialization")
+    parser.add_argument("--size", type=int, default=100, help="hotels per catalog page")
+    parser.add_argument("--reservations", type=int, default=100, help="reservations in /api/v1/me")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    page = hotels_page(args.size)
+    items, payments = reservations(args.reservations)
+    loyalty = {"status": "GOLD", "discount": 10, "reservationCount": args.reservations}
+
+    assert json.loads(model_hotels(page, args.size)) == json.loads(fast_hotels(page, args.size))
+    assert json.loads(model_me(items, payments, loyalty)) == json.loads(fast_me(items, payments, loyalty))
+
+    print(f"encoder: {'orjson ' + orjson.__version__ if orjson else 'json'}")
+    print(f"{'response':<32} {'models, us':>12} {'fast, us':>12} {'speedup':>9}")
+    for name, slow, fast in (
+        (f"GET /api/v1/hotels size={args.size}",
+         lambda: model_hotels(page, args.size), lambda: fast_hotels(page, args.size)),
+        (f"GET /api/v1/me n={args.reservations}",
+         lambda: model_me(items, payments, loyalty), lambda: fast_me(items, payments, loyalty)),
+    ):
+        before, after = measure(slow, args.number), measure(fast, args.number)
+        print(f"{name:<32} {before:>12.1f} {after:>12.1f} {before / after:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
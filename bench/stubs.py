@@ -0,0 +1,198 @@
+import asyncio
+import base64
+import json
+import os
+from typing import List
+from uuid import UUID, uuid4, uuid5, NAMESPACE_DNS
+
+from fastapi import Body, FastAPI, Header, HTTPException, Response
+
+
+LATENCY = float(os.getenv("BENCH_STUB_LATENCY_MS", "0")) / 1000
+HOTELS_COUNT = int(os.getenv("BENCH_HOTELS", "1000"))
+
+
+def encode_cursor(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode((cursor + "=" * (-len(cursor) % 4)).encode()))
+
+
+async def db_roundtrip():
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+
+
+def hotel_uid(i: int) -> UUID:
+    return uuid5(NAMESPACE_DNS, f"hotel-{i}.bench")
+
+
+hotels = [
+    {
+        "id": i,
+        "hotelUid": hotel_uid(i),
+        "name": f"Hotel {i}",
+        "country": "Россия",
+        "city": ("Москва", "Санкт-Петербург", "Казань")[i % 3],
+        "address": f"ул. Тестовая, {i}",
+        "stars": 1 + i % 5,
+        "price": 1000 + 100 * (i % 50),
+    }
+    for i in range(1, HOTELS_COUNT + 1)
+]
+hotels_by_uid = {h["hotelUid"]: h for h in hotels}
+reservations: dict[UUID, dict] = {}
+payments: dict[UUID, dict] = {}
+loyalties: dict[str, dict] = {}
+
+
+def public_hotel(h: dict) -> dict:
+    return {k: v for k, v in h.items() if k != "id"}
+
+
+def public_reservation(r: dict) -> dict:
+    h = hotels_by_uid[r["hotelUid"]]
+    return {
+        "reservationUid": r["reservationUid"],
+        "hotel": {
+            "hotelUid": h["hotelUid"],
+            "name": h["name"],
+            "fullAddress": f"{h['country']}, {h['city']}, {h['address']}",
+            "stars": h["stars"],
+        },
+        "startDate": r["startDate"],
+        "endDate": r["endDate"],
+        "status": r["status"],
+        "paymentUid": r["paymentUid"],
+    }
+
+
+reservation_app = FastAPI(title="Reservation stub")
+payment_app = FastAPI(title="Payment stub")
+loyalty_app = FastAPI(title="Loyalty stub")
+
+
+@reservation_app.get("/manage/health")
+@payment_app.get("/manage/health")
+@loyalty_app.get("/manage/health")
+async def health():
+    return {"status": "ok"}
+
+
+@reservation_app.get("/api/v1/hotels")
+async def list_hotels(page: int = 0, size: int = 1, cursor: str | None = None):
+    await db_roundtrip()
+    start = decode_cursor(cursor)["id"] if cursor else (max(page, 1) - 1) * size
+    rows = hotels[start:start + size + 1]
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor({"id": rows[-1]["id"]})
+    return {"total": len(hotels), "items": [public_hotel(h) for h in rows], "nextCursor": next_cursor}
+
+
+@reservation_app.get("/api/v1/hotel/{hotelUid}")
+async def get_hotel(hotelUid: UUID):
+    await db_roundtrip()
+    h = hotels_by_uid.get(hotelUid)
+    return public_hotel(h) if h else {}
+
+
+@reservation_app.get("/api/v1/me")
+async def user_reservations(x_user_name: str = Header(..., alias="X-User-Name")):
+    await db_roundtrip()
+    return {"reservations": [public_reservation(r) for r in reservations.values() if r["username"] == x_user_name]}
+
+
+@reservation_app.post("/api/v1/reservations")
+async def create_reservation(x_user_name: str = Header(..., alias="X-User-Name"), body: dict = Body(...)):
+    await db_roundtrip()
+    r = {
+        "reservationUid": uuid4(),
+        "username": x_user_name,
+        "hotelUid": UUID(body["hotelUid"]),
+        "paymentUid": UUID(body["paymentUid"]),
+        "startDate": body["startDate"],
+        "endDate": body["endDate"],
+        "status": body["status"],
+    }
+    reservations[r["reservationUid"]] = r
+    return {**public_reservation(r), "hotelUid": r["hotelUid"]}
+
+
+@reservation_app.get("/api/v1/reservations/{reservationUid}")
+async def get_reservation(reservationUid: UUID, x_user_name: str = Header(..., alias="X-User-Name")):
+    await db_roundtrip()
+    r = reservations.get(reservationUid)
+    if not r or r["username"] != x_user_name:
+        raise HTTPException(status_code=404, detail="Билет не найден")
+    return public_reservation(r)
+
+
+@reservation_app.patch("/api/v1/reservations/{reservationUid}/cancel", status_code=204)
+async def cancel_reservation(reservationUid: UUID, x_user_name: str = Header(..., alias="X-User-Name")):
+    await db_roundtrip()
+    r = reservations.get(reservationUid)
+    if not r or r["username"] != x_user_name:
+        raise HTTPException(status_code=404, detail="Бронь не найдена")
+    if r["status"] != "CANCELED":
+        r["status"] = "CANCELED"
+        if r["paymentUid"] in payments:
+            payments[r["paymentUid"]]["status"] = "CANCELED"
+        loyalty = loyalty_of(x_user_name)
+        loyalty["reservationCount"] -= 1
+        count = loyalty["reservationCount"]
+        loyalty["status"] = "BRONZE" if count < 10 else "SILVER" if count < 20 else "GOLD"
+    return Response(status_code=204)
+
+
+@payment_app.get("/api/v1/payments/{paymentUid}")
+async def payment_by_id(paymentUid: UUID):
+    await db_roundtrip()
+    p = payments.get(paymentUid)
+    return {"status": p["status"], "price": p["price"]} if p else {}
+
+
+@payment_app.post("/api/v1/payments/batch")
+async def payments_by_ids(paymentUids: List[UUID] = Body(..., embed=True)):
+    await db_roundtrip()
+    return {"payments": [payments[uid] for uid in set(paymentUids) if uid in payments]}
+
+
+@payment_app.post("/api/v1/payments")
+async def create_payment(price: int = Body(..., embed=True)):
+    await db_roundtrip()
+    p = {"paymentUid": uuid4(), "status": "PAID", "price": price}
+    payments[p["paymentUid"]] = p
+    return p
+
+
+@payment_app.patch("/api/v1/payments/{paymentUid}/cancel")
+async def cancel_payment(paymentUid: UUID):
+    await db_roundtrip()
+    if paymentUid not in payments:
+        raise HTTPException(status_code=404, detail="Запись не найдена")
+    payments[paymentUid]["status"] = "CANCELED"
+    return Response(status_code=204)
+
+
+def loyalty_of(username: str) -> dict:
+    return loyalties.setdefault(username, {"status": "BRONZE", "discount": 5, "reservationCount": 0})
+
+
+@loyalty_app.get("/api/v1/me")
+async def user_loyalty(x_user_name: str = Header(..., alias="X-User-Name")):
+    await db_roundtrip()
+    return loyalty_of(x_user_name)
+
+
+@loyalty_app.patch("/api/v1/loyalty")
+async def update_loyalty(x_user_name: str = Header(..., alias="X-User-Name"), delta: int = Body(..., embed=True)):
+    await db_roundtrip()
+    loyalty = loyalty_of(x_user_name)
+    count = loyalty["reservationCount"] + delta
+    loyalty["reservationCount"] = count
+    loyalty["status"] = "BRONZE" if count < 10 else "SILVER" if count < 20 else "GOLD"
+    return loyalty
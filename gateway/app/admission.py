@@ -0,0 +1,198 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, suppress
+from .metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED
+
+
+class Rejected(Exception):
+    status_code = 503
+
+    def __init__(self, message: str, reason: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimited(Rejected):
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__("Слишком много запросов", "rate_limited", retry_after)
+
+
+class Overloaded(Rejected):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__("Gateway перегружен, повторите запрос позже", reason, retry_after)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ConcurrencyLimiter:
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        ADMISSION_IN_FLIGHT.labels(name).set_function(lambda: self.active)
+        ADMISSION_QUEUED.labels(name).set_function(lambda: len(self._waiters))
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise Overloaded("queue_full", self.queue_timeout)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                with suppress(ValueError):
+                    self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise Overloaded("queue_timeout", self.queue_timeout) from None
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "queued": len(self._waiters), "queueSize": self.queue_size}
+
+
+class RouteLimits:
+    def __init__(self, name: str, rate: float, burst: float, concurrency: ConcurrencyLimiter | None = None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+
+
+class AdmissionController:
+    def __init__(self, routes: dict[tuple[str, str], RouteLimits], default: RouteLimits,
+                 limiter: ConcurrencyLimiter, max_buckets: int, exempt: tuple[str, ...] = ("/manage/",)):
+        self.routes = sorted(routes.items(), key=lambda item: len(item[0][1]), reverse=True)
+        self.default = default
+        self.limiter = limiter
+        self.max_buckets = max_buckets
+        self.exempt = exempt
+        self._buckets: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+
+    def match(self, method: str, path: str) -> RouteLimits | None:
+        if path.startswith(self.exempt):
+            return None
+        for (route_method, prefix), limits in self.routes:
+            if route_method in (method, "*") and path.startswith(prefix):
+                return limits
+        return self.default
+
+    def check_rate(self, limits: RouteLimits, user: str) -> None:
+        if limits.rate <= 0:
+            return
+        key = (limits.name, user)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(limits.rate, limits.burst)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        wait = bucket.take()
+        if wait > 0:
+            raise RateLimited(wait)
+
+    @asynccontextmanager
+    async def admit(self, limits: RouteLimits, user: str | None):
+        acquired = []
+        try:
+            if user:
+                self.check_rate(limits, user)
+            started = time.perf_counter()
+            try:
+                for limiter in (limits.concurrency, self.limiter):
+                    if limiter is not None:
+                        await limiter.acquire()
+                        acquired.append(limiter)
+            finally:
+                ADMISSION_QUEUE_WAIT.labels(limits.name).observe(time.perf_counter() - started)
+        except BaseException as e:
+            for limiter in reversed(acquired):
+                limiter.release()
+            if isinstance(e, Rejected):
+                ADMISSION_REJECTED.labels(limits.name, e.reason).inc()
+            raise
+
+        try:
+            yield
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    def stats(self) -> dict:
+        return {
+            "global": self.limiter.stats(),
+            "routes": {
+                limits.name: limits.concurrency.stats()
+                for _, limits in self.routes
+                if limits.concurrency is not None
+            },
+            "buckets": len(self._buckets),
+        }
+
+
+def parse_routes(raw: str, queue_size: int, queue_timeout: float) -> dict[tuple[str, str], RouteLimits]:
+    routes = {}
+    for part in filter(None, (p.strip() for p in raw.split(";"))):
+        route, value = part.split("=")
+        method, prefix = route.split()
+        rate, burst, *concurrency = value.split("/")
+        name = f"{method} {prefix}"
+        routes[(method.upper(), prefix)] = RouteLimits(
+            name,
+            rate=float(rate),
+            burst=float(burst),
+            concurrency=ConcurrencyLimiter(name, int(concurrency[0]), queue_size, queue_timeout) if concurrency else None,
+        )
+    return routes
+
+
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "512"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "1024"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1.0"))
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "50"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "100"))
+
+admission = AdmissionController(
+    parse_routes(os.getenv("ADMISSION_ROUTES", ""), ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT),
+    default=RouteLimits("default", RATE_LIMIT_RATE, RATE_LIMIT_BURST),
+    limiter=ConcurrencyLimiter("global", ADMISSION_CONCURRENCY, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT),
+    max_buckets=int(os.getenv("RATE_LIMIT_MAX_USERS", "100000")),
+)
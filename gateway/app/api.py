@@ -1,26 +1,96 @@
-from fastapi import APIRouter, Depends, Header, Body, HTTPException, Response, status
+import asyncio
+from fastapi import APIRouter, Depends, Header, Body, HTTPException, Request, Response, status
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from .admission import admission
 from .utils import *
 
 router = APIRouter()
 
 
 @router.get("/manage/health")
-def health():
-    return {"gateway": "ok"}
+async def health():
+    return {"gateway": "ok", "circuits": {service: b.state for service, b in breakers.items()}}
+
+
+@router.get("/manage/metrics")
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/manage/pools")
+async def pool_stats():
+    return {service: pool.stats() for service, pool in pools.items()}
+
+
+@router.get("/manage/single-flight")
+async def single_flight_stats():
+    return single_flight.stats()
+
+
+@router.get("/manage/admission")
+async def admission_stats():
+    return admission.stats()
+
+
+@router.get("/manage/cache")
+async def cache_stats():
+    return {
+        "hotels": hotel_cache.stats(),
+        "hotelPages": hotels_page_cache.stats(),
+        "loyalty": loyalty_cache.stats(),
+    }
+
+
+@router.post("/manage/cache/invalidate")
+async def invalidate_cache(hotelUid: UUID | None = None):
+    invalidated = hotel_cache.invalidate(str(hotelUid) if hotelUid else None)
+    invalidated += hotels_page_cache.invalidate()
+    return {"invalidated": invalidated}
 
 
 @router.get("/api/v1/hotels",
             response_model=PaginationResponse,
             summary="Получить список отелей")
-def get_hotels(params: GetHotelsQuery = Depends()):
-    data = fetch_hotels(params.page, params.size)
-    items = [HotelResponse(**h) for h in data["items"]]
-    return PaginationResponse(
-        page=params.page,
-        pageSize=params.size,
-        totalElements=data["total"],
-        items=items,
-    )
+async def get_hotels(params: GetHotelsQuery = Depends()):
+    data = await get_hotels_page(params.page, params.size, params.cursor)
+    return FastJSONResponse({
+        "page": params.page,
+        "pageSize": params.size,
+        "totalElements": data["total"],
+        "items": [build_hotel_item(h) for h in data["items"]],
+        "nextCursor": data.get("nextCursor"),
+    })
+
+
+@router.get("/api/v1/hotels/search",
+            response_model=PaginationResponse,
+            summary="Поиск отелей")
+async def search_hotels(params: SearchHotelsQuery = Depends()):
+    data = await get_hotels_search(params)
+    return FastJSONResponse({
+        "page": params.page,
+        "pageSize": params.size,
+        "totalElements": data["total"],
+        "totalCapped": data.get("totalCapped", False),
+        "hasMore": data.get("hasMore", False),
+        "items": [build_hotel_item(h) for h in data["items"]],
+    })
+
+
+@router.get("/api/v1/hotels/available",
+            response_model=PaginationResponse,
+            summary="Свободные отели в городе на даты")
+async def get_available_hotels(params: AvailableHotelsQuery = Depends()):
+    if params.endDate <= params.startDate:
+        raise HTTPException(status_code=400, detail="Дата выезда должна быть позже даты заезда")
+
+    data = await fetch_available_hotels(params.model_dump(mode="json"))
+    return FastJSONResponse({
+        "page": params.page,
+        "pageSize": params.size,
+        "totalElements": data["total"],
+        "items": [build_hotel_item(h) for h in data["items"]],
+    })
 
 
 @router.get(
@@ -28,19 +98,29 @@ def get_hotels(params: GetHotelsQuery = Depends()):
     response_model=UserInfoResponse,
     summary="Информация о пользователе",
 )
-def get_user_info(x_user_name: str = Header(..., alias="X-User-Name")):
-    reservations_data = fetch_user_reservations(x_user_name)
-    loyalty_data = fetch_user_loyalty(x_user_name)
-    reservations = concat_reservation_payments(reservations_data.get("reservations", []))
-
-    return UserInfoResponse(
-        reservations=reservations,
-        loyalty=LoyaltyInfoResponse(
-            status=loyalty_data.get("status"),
-            discount=loyalty_data.get("discount"),
-            reservationCount=loyalty_data.get("reservationCount")
-        )
+async def get_user_info(x_user_name: str = Header(..., alias="X-User-Name"),
+                        params: UserReservationsQuery = Depends()):
+    reservations_data, loyalty_data = await asyncio.gather(
+        fetch_user_reservations(x_user_name, params.model_dump(mode="json", exclude_none=True)),
+        get_user_loyalty_or_none(x_user_name),
     )
+    reservations = await concat_reservation_payments(reservations_data.get("reservations", []), x_user_name)
+    next_cursor = reservations_data.get("nextCursor")
+
+    if loyalty_data is None:
+        return FastJSONResponse({
+            "reservations": reservations,
+            "loyalty": None,
+            "degraded": ["loyalty"],
+            "nextCursor": next_cursor,
+        })
+
+    return FastJSONResponse({
+        "reservations": reservations,
+        "loyalty": build_loyalty_info(loyalty_data),
+        "degraded": [],
+        "nextCursor": next_cursor,
+    })
 
 
 @router.get(
@@ -48,76 +128,69 @@ def get_user_info(x_user_name: str = Header(..., alias="X-User-Name")):
     response_model=List[ReservationResponse],
     summary="Информация по всем бронированиям пользователя",
 )
-def get_user_reservations(x_user_name: str = Header(..., alias="X-User-Name")):
-    reservations_data = fetch_user_reservations(x_user_name)
-    reservations = concat_reservation_payments(reservations_data.get("reservations", []))
-    return reservations
+async def get_user_reservations(x_user_name: str = Header(..., alias="X-User-Name"),
+                                params: UserReservationsQuery = Depends()):
+    reservations_data = await fetch_user_reservations(x_user_name, params.model_dump(mode="json", exclude_none=True))
+    reservations = await concat_reservation_payments(reservations_data.get("reservations", []), x_user_name)
+    next_cursor = reservations_data.get("nextCursor")
+    return FastJSONResponse(reservations, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
 
 
 @router.post("/api/v1/reservations",
              response_model=CreateReservationResponse,
              summary="Забронировать отель")
-def create_reservation(x_user_name: str = Header(..., alias="X-User-Name"),
-                       body: CreateReservationRequest = Body(...)):
-    hotel_data = fetch_hotel(body.hotelUid)
-    try:
-        hotel_data = HotelResponse(**hotel_data)
-    except Exception:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Отель с UID {body.hotelUid} не найден"
-        )
-
-    loyalty_data = LoyaltyInfoResponse(**fetch_user_loyalty(x_user_name))
-    payment_data = create_payment(
-        calculate_price(body.startDate, body.endDate, hotel_data.price, loyalty_data.discount))
-    update_loyalty(x_user_name, delta=1)
-
-    reservation_data = create_reservation_in_service({
-        "hotelUid": str(body.hotelUid),
-        "paymentUid": str(payment_data["paymentUid"]),
-        "startDate": body.startDate.isoformat(),
-        "endDate": body.endDate.isoformat(),
-        "status": payment_data["status"],
-    }, x_user_name)
-
-    return CreateReservationResponse(
-        reservationUid=reservation_data["reservationUid"],
-        hotelUid=body.hotelUid,
-        startDate=body.startDate,
-        endDate=body.endDate,
-        discount=loyalty_data.discount,
-        status=payment_data["status"],
-        payment=PaymentInfo(
-            status=payment_data["status"],
-            price=payment_data["price"]
-        )
+async def create_reservation(x_user_name: str = Header(..., alias="X-User-Name"),
+                             body: CreateReservationRequest = Body(...),
+                             idempotency_key: str | None = Header(None, alias="Idempotency-Key")):
+    if idempotency_key is None:
+        return await book_reservation(x_user_name, body)
+
+    return await idempotency_cache.get_or_load(
+        (x_user_name, idempotency_key),
+        lambda: book_reservation(x_user_name, body, f"{x_user_name}:{idempotency_key}"),
     )
 
 
+@router.post("/api/v1/reservations/bulk",
+             summary="Забронировать несколько отелей одним запросом")
+async def create_reservations(request: Request,
+                              x_user_name: str = Header(..., alias="X-User-Name"),
+                              idempotency_key: str | None = Header(None, alias="Idempotency-Key")):
+    items = await read_bulk_items(request)
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Не более {BULK_MAX_ITEMS} бронирований в одном запросе")
+
+    if idempotency_key is None:
+        return FastJSONResponse(await book_reservations(x_user_name, items))
+
+    return FastJSONResponse(await idempotency_cache.get_or_load(
+        (x_user_name, "bulk", idempotency_key),
+        lambda: book_reservations(x_user_name, items, f"{x_user_name}:bulk:{idempotency_key}"),
+    ))
+
+
+@router.post("/api/v1/quotes",
+             summary="Рассчитать стоимость проживания в нескольких отелях с учетом скидки")
+async def quote_prices(request: Request, x_user_name: str = Header(..., alias="X-User-Name")):
+    items = await read_bulk_items(request, "quotes")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Не более {BULK_MAX_ITEMS} позиций в одном запросе")
+
+    return FastJSONResponse(await quote_reservations(x_user_name, items))
+
+
 @router.get("/api/v1/reservations/{reservationUid}",
             response_model=ReservationResponse,
             summary="Информация по конкретному бронированию")
-def get_reservation(
+async def get_reservation(
         reservationUid: UUID,
         x_user_name: str = Header(..., alias="X-User-Name")):
-    reservation = fetch_reservation_by_uid(reservationUid, x_user_name)
+    reservation = await fetch_reservation_by_uid(reservationUid, x_user_name)
     if reservation is None:
         raise HTTPException(status_code=404, detail="Билет не найден")
 
-    payment_data = fetch_payment(reservation["paymentUid"])
-
-    return ReservationResponse(
-        reservationUid=reservation["reservationUid"],
-        hotel=HotelInfo(**reservation["hotel"]),
-        startDate=reservation["startDate"],
-        endDate=reservation["endDate"],
-        status=reservation["status"],
-        payment=PaymentInfo(
-            status=payment_data["status"],
-            price=payment_data["price"]
-        )
-    )
+    payment_data = await fetch_payment(reservation["paymentUid"], x_user_name)
+    return FastJSONResponse(build_reservation_info(reservation, payment_data))
 
 
 @router.delete(
@@ -125,24 +198,21 @@ def get_reservation(
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Отменить бронирование",
 )
-def delete_reservation(
+async def delete_reservation(
         reservationUid: UUID,
         x_user_name: str = Header(..., alias="X-User-Name")):
-    reservation = fetch_reservation_by_uid(reservationUid, x_user_name)
-    if reservation is None:
+    if not await cancel_reservation(reservationUid, x_user_name):
         raise HTTPException(status_code=404, detail="Билет не найден")
 
-    cancel_reservation(reservationUid, x_user_name)
-    cancel_payment(reservation["paymentUid"])
-    update_loyalty(x_user_name, delta=-1)
+    loyalty_cache.bypass(x_user_name, LOYALTY_PENDING_TTL)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.get("/api/v1/loyalty",
             response_model=LoyaltyInfoResponse,
             summary="Получить информацию о статусе в программе лояльности")
-def get_loyalty_status(x_user_name: str = Header(..., alias="X-User-Name")):
-    loyalty_data = fetch_user_loyalty(x_user_name)
+async def get_loyalty_status(x_user_name: str = Header(..., alias="X-User-Name")):
+    loyalty_data = await get_user_loyalty(x_user_name)
     return LoyaltyInfoResponse(
         status=loyalty_data.get("status"),
         discount=loyalty_data.get("discount"),
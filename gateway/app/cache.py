@@ -0,0 +1,177 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+        self._bypass: dict[Hashable, float] = {}
+        self._versions: dict[Hashable, int] = {}
+        self._generation = 0
+        self._cleared = 0
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+        }
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._data.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self._data.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                self._stats["stale_hits"] += 1
+                self._refresh(key, loader)
+                return entry[1]
+
+        self._stats["misses"] += 1
+        version = self.version(key)
+        value = await loader()
+        self._store(key, value, version)
+        return value
+
+    async def get_many(self, keys: list[Hashable],
+                       loader: Callable[[list[Hashable]], Awaitable[dict[Hashable, Any]]]) -> dict[Hashable, Any]:
+        found, missing = {}, []
+        now = time.monotonic()
+        for key in keys:
+            entry = self._data.get(key)
+            if entry is not None and now - entry[0] < self.ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                self._stats["hits" if now - entry[0] < self.ttl else "stale_hits"] += 1
+                found[key] = entry[1]
+            else:
+                self._stats["misses"] += 1
+                missing.append(key)
+
+        if missing:
+            versions = {key: self.version(key) for key in missing}
+            loaded = await loader(missing)
+            for key, value in loaded.items():
+                if key in versions:
+                    self._store(key, value, versions[key])
+            found.update(loaded)
+        return found
+
+    def version(self, key: Hashable) -> int:
+        return self._versions.get(key, self._cleared)
+
+    def _bump(self, key: Hashable) -> None:
+        self._generation += 1
+        self._versions[key] = self._generation
+        if len(self._versions) > 2 * self.maxsize:
+            self._generation += 1
+            self._cleared = self._generation
+            self._versions = {k: v for k, v in self._versions.items() if k in self._data or k == key}
+
+    def _store(self, key: Hashable, value: Any, version: int) -> None:
+        if value and self.version(key) == version:
+            self.set(key, value)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._bump(key)
+        if self.bypassed(key):
+            return
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def bypass(self, key: Hashable, seconds: float) -> None:
+        now = time.monotonic()
+        if len(self._bypass) >= self.maxsize:
+            self._bypass = {k: until for k, until in self._bypass.items() if until > now}
+        self._bypass[key] = now + seconds
+        self._bump(key)
+        self._data.pop(key, None)
+
+    def bypassed(self, key: Hashable) -> bool:
+        until = self._bypass.get(key)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            return True
+        del self._bypass[key]
+        return False
+
+    def invalidate(self, key: Hashable | None = None) -> int:
+        if key is None:
+            count = len(self._data)
+            self._data.clear()
+            self._versions.clear()
+            self._generation += 1
+            self._cleared = self._generation
+            return count
+        self._bump(key)
+        return 1 if self._data.pop(key, None) is not None else 0
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+        hit_ratio = (self._stats["hits"] + self._stats["stale_hits"]) / lookups if lookups else 0.0
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "hit_ratio": round(hit_ratio, 4),
+            "bypassed": len(self._bypass),
+            **self._stats,
+        }
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            version = self.version(key)
+            try:
+                value = await loader()
+                self._store(key, value, version)
+                self._stats["refreshes"] += 1
+            except Exception:
+                self._stats["refresh_errors"] += 1
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+
+hotel_cache = TTLCache(
+    maxsize=int(os.getenv("HOTEL_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("HOTEL_CACHE_TTL", "60")),
+    stale_ttl=float(os.getenv("HOTEL_CACHE_STALE_TTL", "300")),
+)
+
+hotels_page_cache = TTLCache(
+    maxsize=int(os.getenv("HOTELS_PAGE_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("HOTEL_CACHE_TTL", "60")),
+    stale_ttl=float(os.getenv("HOTEL_CACHE_STALE_TTL", "300")),
+)
+
+loyalty_cache = TTLCache(
+    maxsize=int(os.getenv("LOYALTY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("LOYALTY_CACHE_TTL", "30")),
+)
+
+LOYALTY_PENDING_TTL = float(os.getenv("LOYALTY_PENDING_TTL", "30"))
+
+idempotency_cache = TTLCache(
+    maxsize=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400")),
+)
@@ -1,35 +1,235 @@
+import asyncio
+import os
+import time
 import httpx
 from uuid import UUID
+from .metrics import (
+    POOL_CONNECTIONS_OPENED, POOL_IN_FLIGHT, POOL_UTILIZATION, POOL_WAIT, SINGLE_FLIGHT_COALESCED, hops, record_hop,
+)
+from .resilience import (
+    RETRY_ATTEMPTS, SERVICE_TIMEOUTS, DeadlineExceeded, ServiceUnavailable, backoff, breakers, deadline,
+    timeout_budget,
+)
+from .singleflight import SingleFlight
 
 services = {
-    "LOYALTY_URL": "http://loyalty:8050",
-    "PAYMENT_URL": "http://payment:8060",
-    "RESERVATION_URL": "http://reservation:8070",
+    "LOYALTY_URL": os.getenv("LOYALTY_URL", "http://loyalty:8050"),
+    "PAYMENT_URL": os.getenv("PAYMENT_URL", "http://payment:8060"),
+    "RESERVATION_URL": os.getenv("RESERVATION_URL", "http://reservation:8070"),
 }
 
-client = httpx.Client(timeout=5.0)
+WARMUP_TIMEOUT = float(os.getenv("HTTP_WARMUP_TIMEOUT", "1.0"))
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "10"))
 
+single_flight = SingleFlight()
 
-def fetch_hotels(page: int, size: int) -> dict:
-    r = client.get(
+
+def pool_setting(service: str, name: str, default: str) -> str:
+    return os.getenv(f"{service.upper()}_{name}", os.getenv(f"HTTP_{name}", default))
+
+
+class DownstreamPool:
+    def __init__(self, service: str, base_url: str, max_connections: int, max_keepalive_connections: int,
+                 keepalive_expiry: float, http2: bool, warmup: int):
+        self.service = service
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.warmup_connections = warmup
+        self.client: httpx.AsyncClient | None = None
+        self.in_flight = 0
+        self.warmed = 0
+
+        POOL_IN_FLIGHT.labels(service).set_function(lambda: self.in_flight)
+        POOL_UTILIZATION.labels(service).set_function(lambda: self.in_flight / self.max_connections)
+
+    async def open(self) -> None:
+        self.client = httpx.AsyncClient(
+            timeout=5.0,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+        )
+        await self.warmup()
+
+    async def warmup(self) -> None:
+        results = await asyncio.gather(
+            *(self.request("GET", f"{self.base_url}/manage/health", timeout=WARMUP_TIMEOUT)
+              for _ in range(self.warmup_connections)),
+            return_exceptions=True,
+        )
+        self.warmed = sum(1 for r in results if isinstance(r, httpx.Response))
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def trace(self, started: float):
+        async def trace(event: str, info: dict) -> None:
+            if event == "connection.connect_tcp.complete":
+                POOL_CONNECTIONS_OPENED.labels(self.service).inc()
+            elif event.endswith(".send_request_headers.started"):
+                POOL_WAIT.labels(self.service).observe(time.perf_counter() - started)
+
+        return trace
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            return await self.client.request(method, url, extensions={"trace": self.trace(started)}, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "http2": self.http2,
+            "in_flight": self.in_flight,
+            "utilization": round(self.in_flight / self.max_connections, 4),
+            "warmed": self.warmed,
+        }
+
+
+pools = {
+    service: DownstreamPool(
+        service,
+        services[f"{service.upper()}_URL"],
+        max_connections=int(pool_setting(service, "MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(pool_setting(service, "MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(pool_setting(service, "KEEPALIVE_EXPIRY", "5")),
+        http2=pool_setting(service, "HTTP2", "false").lower() in ("1", "true", "yes"),
+        warmup=int(pool_setting(service, "WARMUP_CONNECTIONS", "4")),
+    )
+    for service in SERVICE_TIMEOUTS
+}
+
+
+async def open_pools() -> None:
+    await asyncio.gather(*(pool.open() for pool in pools.values()))
+
+
+async def close_pools() -> None:
+    await asyncio.gather(*(pool.close() for pool in pools.values()))
+
+
+async def call_downstream(service: str, operation: str, method: str, url: str, **kwargs) -> httpx.Response:
+    if method != "GET" or not SINGLE_FLIGHT:
+        return await send_downstream(service, operation, method, url, **kwargs)
+
+    key = (str(httpx.URL(url, params=kwargs.get("params"))), tuple(sorted((kwargs.get("headers") or {}).items())))
+    coalesced = key in single_flight
+    if coalesced:
+        SINGLE_FLIGHT_COALESCED.labels(service, operation).inc()
+
+    timeout = SINGLE_FLIGHT_TIMEOUT
+    current = deadline.get()
+    if current is not None:
+        timeout = min(timeout, max(0.0, current - time.monotonic()))
+
+    async def shared():
+        deadline.set(None)
+        return await send_downstream(service, operation, method, url, **kwargs)
+
+    started = time.perf_counter()
+    try:
+        return await single_flight.do(key, shared, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(service) from None
+    finally:
+        current = hops.get()
+        if coalesced and current is not None:
+            current.append((service, f"{operation} coalesced", time.perf_counter() - started))
+
+
+async def send_downstream(service: str, operation: str, method: str, url: str, **kwargs) -> httpx.Response:
+    breaker = breakers[service]
+    pool = pools[service]
+    attempts = 1 + (RETRY_ATTEMPTS if method == "GET" else 0)
+
+    for attempt in range(attempts):
+        timeout = timeout_budget(service, operation)
+        breaker.before_call()
+
+        started = time.perf_counter()
+        try:
+            r = await pool.request(method, url, timeout=timeout, **kwargs)
+        except httpx.TransportError as e:
+            record_hop(service, operation, "error", time.perf_counter() - started)
+            breaker.on_failure()
+            if attempt + 1 < attempts:
+                await asyncio.sleep(backoff(attempt))
+                continue
+            raise ServiceUnavailable(service, type(e).__name__) from e
+
+        record_hop(service, operation, str(r.status_code), time.perf_counter() - started)
+        if r.status_code < 500:
+            breaker.on_success()
+            return r
+
+        breaker.on_failure()
+        if attempt + 1 < attempts:
+            await asyncio.sleep(backoff(attempt))
+            continue
+        raise ServiceUnavailable(service, f"HTTP {r.status_code}")
+
+
+async def fetch_hotels(page: int, size: int, cursor: str | None = None) -> dict:
+    params = {"page": page, "size": size}
+    if cursor:
+        params["cursor"] = cursor
+    r = await call_downstream(
+        "reservation", "fetch_hotels", "GET",
         f"{services['RESERVATION_URL']}/api/v1/hotels",
-        params={"page": page, "size": size},
+        params=params,
     )
     r.raise_for_status()
     return r.json()
 
 
-def fetch_user_reservations(username: str) -> dict:
-    r = client.get(
+async def fetch_hotels_search(params: dict) -> dict:
+    r = await call_downstream(
+        "reservation", "fetch_hotels_search", "GET",
+        f"{services['RESERVATION_URL']}/api/v1/hotels/search",
+        params=params,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+async def fetch_available_hotels(params: dict) -> dict:
+    r = await call_downstream(
+        "reservation", "fetch_available_hotels", "GET",
+        f"{services['RESERVATION_URL']}/api/v1/hotels/available",
+        params=params,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+async def fetch_user_reservations(username: str, params: dict | None = None) -> dict:
+    r = await call_downstream(
+        "reservation", "fetch_user_reservations", "GET",
         f"{services['RESERVATION_URL']}/api/v1/me",
         headers={"X-User-Name": username},
+        params=params,
     )
     r.raise_for_status()
     return r.json()
 
 
-def fetch_reservation_by_uid(reservation_uid: UUID, username: str) -> dict:
-    r = client.get(
+async def fetch_reservation_by_uid(reservation_uid: UUID, username: str) -> dict:
+    r = await call_downstream(
+        "reservation", "fetch_reservation_by_uid", "GET",
         f"{services['RESERVATION_URL']}/api/v1/reservations/{reservation_uid}",
         headers={"X-User-Name": username},
     )
@@ -37,43 +237,98 @@ def fetch_reservation_by_uid(reservation_uid: UUID, username: str) -> dict:
     return r.json()
 
 
-def fetch_hotel(hotel_uid: UUID) -> dict:
-    r = client.get(
+async def fetch_hotel(hotel_uid: UUID) -> dict:
+    r = await call_downstream(
+        "reservation", "fetch_hotel", "GET",
         f"{services['RESERVATION_URL']}/api/v1/hotel/{hotel_uid}"
     )
     r.raise_for_status()
     return r.json()
 
 
-def create_reservation_in_service(res_data: dict, username: str) -> dict:
-    r = client.post(
+async def fetch_hotels_by_ids(hotel_uids: list[str]) -> dict[str, dict]:
+    r = await call_downstream(
+        "reservation", "fetch_hotels_by_ids", "POST",
+        f"{services['RESERVATION_URL']}/api/v1/hotels/batch",
+        json={"hotelUids": hotel_uids},
+    )
+    r.raise_for_status()
+    return {h["hotelUid"]: h for h in r.json()["hotels"]}
+
+
+def idempotency_headers(idempotency_key: str | None) -> dict:
+    return {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+
+
+async def create_reservation_in_service(res_data: dict, username: str, idempotency_key: str | None = None) -> dict:
+    r = await call_downstream(
+        "reservation", "create_reservation_in_service", "POST",
         f"{services['RESERVATION_URL']}/api/v1/reservations",
-        headers={"X-User-Name": username},
+        headers={"X-User-Name": username, **idempotency_headers(idempotency_key)},
         json=res_data,
     )
     r.raise_for_status()
     return r.json()
 
 
-def create_payment(price: int) -> dict:
-    r = client.post(
+async def create_reservations_in_service(items: list[dict], username: str,
+                                        idempotency_key: str | None = None) -> list[dict]:
+    r = await call_downstream(
+        "reservation", "create_reservations_in_service", "POST",
+        f"{services['RESERVATION_URL']}/api/v1/reservations/bulk",
+        headers={"X-User-Name": username, **idempotency_headers(idempotency_key)},
+        json={"reservations": items},
+    )
+    r.raise_for_status()
+    return r.json()["results"]
+
+
+async def create_payment(price: int, username: str, idempotency_key: str | None = None) -> dict:
+    r = await call_downstream(
+        "payment", "create_payment", "POST",
         f"{services['PAYMENT_URL']}/api/v1/payments",
+        headers={"X-User-Name": username, **idempotency_headers(idempotency_key)},
         json={"price": price},
     )
     r.raise_for_status()
     return r.json()
 
 
-def fetch_payment(payment_uid: UUID) -> dict:
-    r = client.get(
-        f"{services['PAYMENT_URL']}/api/v1/payments/{payment_uid}"
+async def create_payments(prices: list[int], username: str, idempotency_key: str | None = None) -> list[dict]:
+    r = await call_downstream(
+        "payment", "create_payments", "POST",
+        f"{services['PAYMENT_URL']}/api/v1/payments/bulk",
+        headers={"X-User-Name": username, **idempotency_headers(idempotency_key)},
+        json={"prices": prices},
+    )
+    r.raise_for_status()
+    return r.json()["payments"]
+
+
+async def fetch_payment(payment_uid: UUID, username: str) -> dict:
+    r = await call_downstream(
+        "payment", "fetch_payment", "GET",
+        f"{services['PAYMENT_URL']}/api/v1/payments/{payment_uid}",
+        headers={"X-User-Name": username},
     )
     r.raise_for_status()
     return r.json()
 
 
-def fetch_user_loyalty(username: str) -> dict:
-    r = client.get(
+async def fetch_payments(payment_uids: list[UUID], username: str) -> dict[str, dict]:
+    r = await call_downstream(
+        "payment", "fetch_payments", "POST",
+        f"{services['PAYMENT_URL']}/api/v1/payments/batch",
+        headers={"X-User-Name": username},
+        json={"paymentUids": [str(uid) for uid in payment_uids]},
+    )
+    r.raise_for_status()
+    return {p["paymentUid"]: p for p in r.json()["payments"]}
+
+
+async def fetch_user_loyalty(username: str) -> dict:
+    r = await call_downstream(
+        "loyalty", "fetch_user_loyalty", "GET",
         f"{services['LOYALTY_URL']}/api/v1/me",
         headers={"X-User-Name": username},
     )
@@ -81,26 +336,45 @@ def fetch_user_loyalty(username: str) -> dict:
     return r.json()
 
 
-def update_loyalty(username: str, delta: int) -> dict:
-    r = client.patch(
+async def update_loyalty(username: str, delta: int, idempotency_key: str | None = None) -> dict:
+    r = await call_downstream(
+        "loyalty", "update_loyalty", "PATCH",
         f"{services['LOYALTY_URL']}/api/v1/loyalty",
-        headers={"X-User-Name": username},
+        headers={"X-User-Name": username, **idempotency_headers(idempotency_key)},
         json={"delta": delta},
     )
     r.raise_for_status()
     return r.json()
 
 
-def cancel_payment(payment_uid: UUID) -> None:
-    r = client.patch(
+async def cancel_payment(payment_uid: UUID, username: str) -> None:
+    r = await call_downstream(
+        "payment", "cancel_payment", "PATCH",
         f"{services['PAYMENT_URL']}/api/v1/payments/{payment_uid}/cancel",
+        headers={"X-User-Name": username},
+    )
+    r.raise_for_status()
+
+
+async def cancel_payments(payment_uids: list[UUID], username: str) -> None:
+    if not payment_uids:
+        return
+    r = await call_downstream(
+        "payment", "cancel_payments", "POST",
+        f"{services['PAYMENT_URL']}/api/v1/payments/cancel",
+        headers={"X-User-Name": username},
+        json={"paymentUids": [str(uid) for uid in payment_uids]},
     )
     r.raise_for_status()
 
 
-def cancel_reservation(reservation_uid: UUID, username: str) -> None:
-    r = client.patch(
+async def cancel_reservation(reservation_uid: UUID, username: str) -> bool:
+    r = await call_downstream(
+        "reservation", "cancel_reservation", "PATCH",
         f"{services['RESERVATION_URL']}/api/v1/reservations/{reservation_uid}/cancel",
         headers={"X-User-Name": username},
     )
+    if r.status_code == 404:
+        return False
     r.raise_for_status()
+    return True
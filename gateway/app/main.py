@@ -1,5 +1,58 @@
-from fastapi import FastAPI
+import math
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from .admission import Rejected, admission
 from .api import router
+from .clients import open_pools, close_pools
+from .metrics import hops, server_timing
+from .resilience import REQUEST_DEADLINE, ServiceUnavailable, deadline
 
-app = FastAPI(title="Gateway API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_pools()
+    yield
+    await close_pools()
+
+
+app = FastAPI(title="Gateway API", lifespan=lifespan)
 app.include_router(router)
+
+
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    recorded = []
+    hops_token = hops.set(recorded)
+    deadline_token = deadline.set(time.monotonic() + REQUEST_DEADLINE)
+    try:
+        response = await call_next(request)
+    finally:
+        deadline.reset(deadline_token)
+        hops.reset(hops_token)
+    response.headers["Server-Timing"] = server_timing(time.perf_counter() - started, recorded)
+    return response
+
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    limits = admission.match(request.method, request.url.path)
+    if limits is None:
+        return await call_next(request)
+    try:
+        async with admission.admit(limits, request.headers.get("X-User-Name")):
+            return await call_next(request)
+    except Rejected as exc:
+        return JSONResponse(
+            status_code=exc.status_code,
+            content={"message": str(exc)},
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+        )
+
+
+@app.exception_handler(ServiceUnavailable)
+async def service_unavailable_handler(request: Request, exc: ServiceUnavailable):
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))} if exc.retry_after else None
+    return JSONResponse(status_code=503, content={"message": str(exc)}, headers=headers)
@@ -0,0 +1,98 @@
+from contextvars import ContextVar
+from prometheus_client import Counter, Gauge, Histogram
+
+DOWNSTREAM_LATENCY = Histogram(
+    "gateway_downstream_request_duration_seconds",
+    "Time spent waiting for a downstream service",
+    ["service", "operation", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+DOWNSTREAM_ERRORS = Counter(
+    "gateway_downstream_errors_total",
+    "Downstream calls that failed or returned an error status",
+    ["service", "operation", "status"],
+)
+
+CIRCUIT_STATE = Gauge(
+    "gateway_circuit_state",
+    "Circuit breaker state per downstream service: 0 closed, 1 half-open, 2 open",
+    ["service"],
+)
+
+POOL_WAIT = Histogram(
+    "gateway_downstream_pool_wait_seconds",
+    "Time from issuing a downstream request until its headers are sent, including waiting for a connection",
+    ["service"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+POOL_CONNECTIONS_OPENED = Counter(
+    "gateway_downstream_connections_opened_total",
+    "New TCP connections opened to a downstream service",
+    ["service"],
+)
+
+POOL_IN_FLIGHT = Gauge(
+    "gateway_downstream_in_flight_requests",
+    "Downstream requests currently in flight",
+    ["service"],
+)
+
+POOL_UTILIZATION = Gauge(
+    "gateway_downstream_pool_utilization",
+    "In-flight requests divided by the connection limit of the downstream pool",
+    ["service"],
+)
+
+SINGLE_FLIGHT_COALESCED = Counter(
+    "gateway_single_flight_coalesced_total",
+    "Downstream GETs that joined an identical request already in flight instead of sending their own",
+    ["service", "operation"],
+)
+
+ADMISSION_REJECTED = Counter(
+    "gateway_admission_rejected_total",
+    "Requests rejected by admission control",
+    ["route", "reason"],
+)
+
+ADMISSION_QUEUE_WAIT = Histogram(
+    "gateway_admission_queue_wait_seconds",
+    "Time a request spent queued for a concurrency slot before it was admitted or rejected",
+    ["route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "gateway_admission_in_flight_requests",
+    "Requests holding a concurrency slot",
+    ["limiter"],
+)
+
+ADMISSION_QUEUED = Gauge(
+    "gateway_admission_queued_requests",
+    "Requests waiting for a concurrency slot",
+    ["limiter"],
+)
+
+hops: ContextVar[list | None] = ContextVar("hops", default=None)
+
+
+def record_hop(service: str, operation: str, status: str, elapsed: float) -> None:
+    DOWNSTREAM_LATENCY.labels(service, operation, status).observe(elapsed)
+    if status == "error" or int(status) >= 400:
+        DOWNSTREAM_ERRORS.labels(service, operation, status).inc()
+
+    current = hops.get()
+    if current is not None:
+        current.append((service, operation, elapsed))
+
+
+def server_timing(total: float, recorded: list) -> str:
+    entries = [
+        f'{service};desc="{operation}";dur={elapsed * 1000:.2f}'
+        for service, operation, elapsed in recorded
+    ]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
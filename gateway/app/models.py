@@ -37,7 +37,12 @@ class PaginationResponse(BaseModel):
     page: int
     pageSize: int
     totalElements: int
+    totalCapped: bool | None = Field(
+        None, description="totalElements обрезан до SEARCH_TOTAL_CAP, реальное число совпадений больше",
+    )
+    hasMore: bool | None = None
     items: List[HotelResponse]
+    nextCursor: str | None = None
 
 
 class HotelInfo(BaseModel):
@@ -69,7 +74,9 @@ class LoyaltyInfoResponse(BaseModel):
 
 class UserInfoResponse(BaseModel):
     reservations: List[ReservationResponse]
-    loyalty: LoyaltyInfoResponse
+    loyalty: LoyaltyInfoResponse | None
+    degraded: List[str] = []
+    nextCursor: str | None = None
 
 
 class CreateReservationRequest(BaseModel):
@@ -105,3 +112,31 @@ class ValidationErrorResponse(BaseModel):
 class GetHotelsQuery(BaseModel):
     page: int = Field(0, ge=0)
     size: int = Field(1, ge=1, le=100)
+    cursor: str | None = None
+
+
+class SearchHotelsQuery(BaseModel):
+    q: str | None = Field(None, min_length=3, max_length=80)
+    city: str | None = None
+    country: str | None = None
+    minStars: int | None = Field(None, ge=1, le=5)
+    maxStars: int | None = Field(None, ge=1, le=5)
+    minPrice: int | None = Field(None, ge=0)
+    maxPrice: int | None = Field(None, ge=0)
+    sort: str = Field("price", pattern="^-?(price|stars)$")
+    page: int = Field(1, ge=1)
+    size: int = Field(10, ge=1, le=100)
+
+
+class AvailableHotelsQuery(BaseModel):
+    city: str
+    startDate: date
+    endDate: date
+    page: int = Field(1, ge=1)
+    size: int = Field(10, ge=1, le=100)
+
+
+class UserReservationsQuery(BaseModel):
+    size: int | None = Field(None, ge=1, le=100)
+    cursor: str | None = None
+    status: ReservationStatus | None = None
@@ -0,0 +1,125 @@
+import os
+import random
+import time
+from contextvars import ContextVar
+import httpx
+from .metrics import CIRCUIT_STATE
+
+
+class ServiceUnavailable(Exception):
+    def __init__(self, service: str, reason: str, retry_after: float | None = None):
+        super().__init__(f"Сервис {service} недоступен: {reason}")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class CircuitOpen(ServiceUnavailable):
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(service, "circuit breaker открыт", retry_after)
+
+
+class DeadlineExceeded(ServiceUnavailable):
+    def __init__(self, service: str):
+        super().__init__(service, "истек дедлайн запроса")
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, service: str, failure_threshold: int, recovery_timeout: float, half_open_calls: int):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.recovery_timeout:
+                raise CircuitOpen(self.service, self.recovery_timeout - elapsed)
+            self.state = self.HALF_OPEN
+            self.probes = 0
+
+        if self.state == self.HALF_OPEN:
+            if self.probes >= self.half_open_calls:
+                raise CircuitOpen(self.service, self.recovery_timeout)
+            self.probes += 1
+
+    def on_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probes = 0
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probes = 0
+
+
+def failed_before_commit(e: BaseException) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code < 500
+    if isinstance(e, ServiceUnavailable):
+        return e.__cause__ is None or isinstance(e.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+    return False
+
+
+def parse_timeouts(raw: str) -> dict[str, float]:
+    result = {}
+    for part in filter(None, raw.split(",")):
+        name, value = part.split("=")
+        result[name.strip()] = float(value)
+    return result
+
+
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "10"))
+SERVICE_TIMEOUTS = {
+    "reservation": float(os.getenv("RESERVATION_TIMEOUT", "3")),
+    "payment": float(os.getenv("PAYMENT_TIMEOUT", "3")),
+    "loyalty": float(os.getenv("LOYALTY_TIMEOUT", "2")),
+}
+OPERATION_TIMEOUTS = parse_timeouts(os.getenv("OPERATION_TIMEOUTS", ""))
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "2"))
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", "0.05"))
+RETRY_BACKOFF_MAX = float(os.getenv("RETRY_BACKOFF_MAX", "0.5"))
+
+breakers = {
+    service: CircuitBreaker(
+        service,
+        failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+        recovery_timeout=float(os.getenv("BREAKER_RECOVERY_TIMEOUT", "10")),
+        half_open_calls=int(os.getenv("BREAKER_HALF_OPEN_CALLS", "1")),
+    )
+    for service in SERVICE_TIMEOUTS
+}
+
+for breaker in breakers.values():
+    CIRCUIT_STATE.labels(breaker.service).set_function(
+        lambda b=breaker: {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}[b.state]
+    )
+
+deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+def timeout_budget(service: str, operation: str) -> float:
+    budget = OPERATION_TIMEOUTS.get(operation, SERVICE_TIMEOUTS[service])
+    current = deadline.get()
+    if current is None:
+        return budget
+    remaining = current - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded(service)
+    return min(budget, remaining)
+
+
+def backoff(attempt: int) -> float:
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt))
@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self._stats = {"calls": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: float | None = None) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self._stats["calls"] += 1
+            task = self._calls[key] = asyncio.create_task(fn())
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self._stats["coalesced"] += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            if task.done():
+                raise
+            self._stats["timeouts"] += 1
+            raise
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["errors"] += 1
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), **self._stats}
@@ -1,27 +1,349 @@
+import asyncio
+import json
+import os
+from contextlib import suppress
+from fastapi import HTTPException, Request
+from .cache import LOYALTY_PENDING_TTL, hotel_cache, hotels_page_cache, idempotency_cache, loyalty_cache
 from .clients import *
 from .models import *
+from .resilience import failed_before_commit
+from .responses import FastJSONResponse
 
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
 
-def concat_reservation_payments(reservations: list[dict]) -> list[ReservationResponse]:
-    result = []
-    for r in reservations:
-        payment_data = fetch_payment(r["paymentUid"])
-        result.append(
-            ReservationResponse(
-                reservationUid=r["reservationUid"],
-                hotel=HotelInfo(**r["hotel"]),
-                startDate=r["startDate"],
-                endDate=r["endDate"],
-                status=r["status"],
-                payment=PaymentInfo(
-                    status=PaymentStatus(payment_data["status"]),
-                    price=payment_data["price"]
-                )
-            )
+
+async def get_hotel(hotel_uid: UUID) -> dict:
+    return await hotel_cache.get_or_load(str(hotel_uid), lambda: fetch_hotel(hotel_uid))
+
+
+async def get_hotels(hotel_uids: list[str]) -> dict[str, dict]:
+    return await hotel_cache.get_many(hotel_uids, fetch_hotels_by_ids)
+
+
+async def get_hotels_page(page: int, size: int, cursor: str | None = None) -> dict:
+    async def load():
+        data = await fetch_hotels(page, size, cursor)
+        for h in data["items"]:
+            hotel_cache.set(str(h["hotelUid"]), h)
+        return data
+
+    return await hotels_page_cache.get_or_load((page, size, cursor), load)
+
+
+async def get_hotels_search(params: SearchHotelsQuery) -> dict:
+    query = params.model_dump(exclude_none=True)
+
+    async def load():
+        data = await fetch_hotels_search(query)
+        for h in data["items"]:
+            hotel_cache.set(str(h["hotelUid"]), h)
+        return data
+
+    return await hotels_page_cache.get_or_load(("search", *sorted(query.items())), load)
+
+
+async def get_user_loyalty(username: str) -> dict:
+    return await loyalty_cache.get_or_load(username, lambda: fetch_user_loyalty(username))
+
+
+async def get_user_loyalty_or_none(username: str) -> dict | None:
+    try:
+        return await get_user_loyalty(username)
+    except ServiceUnavailable:
+        return None
+
+
+async def apply_loyalty_delta(username: str, delta: int, idempotency_key: str | None = None) -> dict:
+    loyalty_data = await update_loyalty(username, delta, idempotency_key)
+    if loyalty_data:
+        loyalty_cache.set(username, loyalty_data)
+    else:
+        loyalty_cache.invalidate(username)
+    return loyalty_data
+
+
+async def create_or_reconcile(create):
+    try:
+        return await create()
+    except Exception as e:
+        if failed_before_commit(e):
+            raise
+    return await create()
+
+
+async def book_reservation(username: str, body: CreateReservationRequest,
+                           idempotency_key: str | None = None) -> CreateReservationResponse:
+    if body.endDate <= body.startDate:
+        raise HTTPException(status_code=400, detail="Дата выезда должна быть позже даты заезда")
+
+    hotel_data, loyalty_data = await asyncio.gather(
+        get_hotel(body.hotelUid),
+        get_user_loyalty(username),
+    )
+    try:
+        hotel_data = HotelResponse(**hotel_data)
+    except Exception:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Отель с UID {body.hotelUid} не найден"
         )
-    return result
+
+    loyalty_data = LoyaltyInfoResponse(**loyalty_data)
+    payment_data = await create_payment(
+        calculate_price(body.startDate, body.endDate, hotel_data.price, loyalty_data.discount),
+        username,
+        idempotency_key,
+    )
+    if payment_data["status"] != "PAID":
+        raise HTTPException(status_code=409, detail="Бронирование с этим Idempotency-Key уже отменено")
+
+    reservation = {
+        "hotelUid": str(body.hotelUid),
+        "paymentUid": str(payment_data["paymentUid"]),
+        "startDate": body.startDate.isoformat(),
+        "endDate": body.endDate.isoformat(),
+        "status": payment_data["status"],
+    }
+    reservation_key = idempotency_key or f"payment:{payment_data['paymentUid']}"
+    reservation_data, loyalty_result = await asyncio.gather(
+        create_or_reconcile(lambda: create_reservation_in_service(reservation, username, reservation_key)),
+        apply_loyalty_delta(username, delta=1, idempotency_key=idempotency_key),
+        return_exceptions=True,
+    )
+
+    if isinstance(reservation_data, Exception) and failed_before_commit(reservation_data):
+        compensations = [cancel_payment(payment_data["paymentUid"], username)]
+        if not isinstance(loyalty_result, BaseException):
+            compensations.append(apply_loyalty_delta(
+                username, delta=-1, idempotency_key=f"{idempotency_key}:revert" if idempotency_key else None,
+            ))
+        await asyncio.gather(*compensations, return_exceptions=True)
+        if isinstance(reservation_data, httpx.HTTPStatusError) and reservation_data.response.status_code == 409:
+            raise HTTPException(status_code=409, detail="Отель уже забронирован на эти даты")
+    for result in (reservation_data, loyalty_result):
+        if isinstance(result, BaseException):
+            raise result
+
+    return CreateReservationResponse(
+        reservationUid=reservation_data["reservationUid"],
+        hotelUid=body.hotelUid,
+        startDate=body.startDate,
+        endDate=body.endDate,
+        discount=loyalty_data.discount,
+        status=payment_data["status"],
+        payment=PaymentInfo(
+            status=payment_data["status"],
+            price=payment_data["price"]
+        )
+    )
+
+
+async def read_bulk_items(request: Request, field: str = "reservations") -> list:
+    raw = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            return [json.loads(line) for line in raw.splitlines() if line.strip()]
+        items = json.loads(raw)[field]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Неверный формат запроса")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Неверный формат запроса")
+    return items
+
+
+def parse_bulk_items(items: list) -> tuple[list[dict | None], list[tuple[int, CreateReservationRequest]]]:
+    results: list[dict | None] = [None] * len(items)
+    requests = []
+    for i, item in enumerate(items):
+        try:
+            body = CreateReservationRequest(**item)
+        except (TypeError, ValueError):
+            results[i] = {"index": i, "code": 400, "message": "Неверный формат бронирования"}
+            continue
+        if body.endDate <= body.startDate:
+            results[i] = {"index": i, "code": 400, "message": "Дата выезда должна быть позже даты заезда"}
+            continue
+        requests.append((i, body))
+    return results, requests
+
+
+async def book_reservations(username: str, items: list, idempotency_key: str | None = None) -> dict:
+    results, requests = parse_bulk_items(items)
+    degraded = []
+
+    if requests:
+        hotels, loyalty_data = await asyncio.gather(
+            get_hotels(list({str(body.hotelUid) for _, body in requests})),
+            get_user_loyalty(username),
+        )
+        discount = LoyaltyInfoResponse(**loyalty_data).discount
+
+        found = []
+        for i, body in requests:
+            hotel = hotels.get(str(body.hotelUid))
+            if not hotel:
+                results[i] = {"index": i, "code": 400, "message": f"Отель с UID {body.hotelUid} не найден"}
+                continue
+            found.append((i, body, hotel["price"]))
+        prices = calculate_prices([(body.startDate, body.endDate, price) for _, body, price in found], discount)
+        priced = [(i, body, price) for (i, body, _), price in zip(found, prices)]
+
+        if priced:
+            payments = await create_payments([price for _, _, price in priced], username, idempotency_key)
+            paid = []
+            for (i, body, price), payment in zip(priced, payments):
+                if payment["status"] != "PAID":
+                    results[i] = {"index": i, "code": 409, "message": "Бронирование с этим Idempotency-Key уже отменено"}
+                    continue
+                paid.append(((i, body, price), payment))
+            priced = [item for item, _ in paid]
+            payments = [payment for _, payment in paid]
+
+        if priced:
+            reservation_items = [
+                {
+                    "index": i,
+                    "hotelUid": str(body.hotelUid),
+                    "paymentUid": str(payment["paymentUid"]),
+                    "startDate": body.startDate.isoformat(),
+                    "endDate": body.endDate.isoformat(),
+                    "status": payment["status"],
+                }
+                for (i, body, _), payment in zip(priced, payments)
+            ]
+            reservation_key = idempotency_key or f"payment:{payments[0]['paymentUid']}"
+            try:
+                reservations = await create_or_reconcile(
+                    lambda: create_reservations_in_service(reservation_items, username, reservation_key),
+                )
+            except Exception as e:
+                if failed_before_commit(e):
+                    with suppress(Exception):
+                        await cancel_payments([payment["paymentUid"] for payment in payments], username)
+                raise
+
+            rejected = []
+            for (i, body, _), payment, reservation in zip(priced, payments, reservations):
+                if reservation["code"] != 200:
+                    results[i] = {"index": i, "code": reservation["code"], "message": reservation["message"]}
+                    rejected.append(payment["paymentUid"])
+                    continue
+                results[i] = {
+                    "index": i,
+                    "code": 200,
+                    "reservation": {
+                        "reservationUid": reservation["reservationUid"],
+                        "hotelUid": str(body.hotelUid),
+                        "startDate": body.startDate.isoformat(),
+                        "endDate": body.endDate.isoformat(),
+                        "discount": discount,
+                        "status": payment["status"],
+                        "payment": {"status": payment["status"], "price": payment["price"]},
+                    },
+                }
+
+            created = len(priced) - len(rejected)
+            followups = {"payment": cancel_payments(rejected, username)}
+            if created:
+                followups["loyalty"] = apply_loyalty_delta(username, delta=created, idempotency_key=idempotency_key)
+            outcomes = await asyncio.gather(*followups.values(), return_exceptions=True)
+            degraded = [name for name, outcome in zip(followups, outcomes) if isinstance(outcome, Exception)]
+
+    created = sum(1 for r in results if r["code"] == 200)
+    return {"created": created, "failed": len(results) - created, "degraded": degraded, "results": results}
+
+
+async def quote_reservations(username: str, items: list) -> dict:
+    results, requests = parse_bulk_items(items)
+    if not requests:
+        return {"discount": None, "degraded": [], "results": results}
+
+    hotels, loyalty_data = await asyncio.gather(
+        get_hotels(list({str(body.hotelUid) for _, body in requests})),
+        get_user_loyalty_or_none(username),
+    )
+    discount = (loyalty_data or {}).get("discount", 0)
+
+    found = []
+    for i, body in requests:
+        hotel = hotels.get(str(body.hotelUid))
+        if not hotel:
+            results[i] = {"index": i, "code": 400, "message": f"Отель с UID {body.hotelUid} не найден"}
+            continue
+        found.append((i, body, hotel["price"]))
+
+    prices = calculate_prices([(body.startDate, body.endDate, price) for _, body, price in found], discount)
+    for (i, body, price_per_night), price in zip(found, prices):
+        results[i] = {
+            "index": i,
+            "code": 200,
+            "quote": {
+                "hotelUid": str(body.hotelUid),
+                "startDate": body.startDate.isoformat(),
+                "endDate": body.endDate.isoformat(),
+                "nights": (body.endDate - body.startDate).days,
+                "pricePerNight": price_per_night,
+                "discount": discount,
+                "price": price,
+            },
+        }
+
+    return {"discount": discount, "degraded": ["loyalty"] if loyalty_data is None else [], "results": results}
+
+
+def build_hotel_item(h: dict) -> dict:
+    return {
+        "hotelUid": h["hotelUid"],
+        "name": h["name"],
+        "country": h["country"],
+        "city": h["city"],
+        "address": h["address"],
+        "stars": h["stars"],
+        "price": h["price"],
+    }
+
+
+def build_loyalty_info(loyalty_data: dict) -> dict:
+    return {
+        "status": loyalty_data.get("status"),
+        "discount": loyalty_data.get("discount"),
+        "reservationCount": loyalty_data.get("reservationCount"),
+    }
+
+
+def build_reservation_info(r: dict, payment_data: dict) -> dict:
+    hotel = r["hotel"]
+    return {
+        "reservationUid": r["reservationUid"],
+        "hotel": {
+            "hotelUid": hotel["hotelUid"],
+            "name": hotel["name"],
+            "fullAddress": hotel["fullAddress"],
+            "stars": hotel["stars"],
+        },
+        "startDate": r["startDate"][:10] if r["startDate"] else None,
+        "endDate": r["endDate"][:10] if r["endDate"] else None,
+        "status": r["status"],
+        "payment": {
+            "status": payment_data["status"],
+            "price": payment_data["price"],
+        },
+    }
+
+
+async def concat_reservation_payments(reservations: list[dict], username: str) -> list[dict]:
+    if not reservations:
+        return []
+
+    payments = await fetch_payments([r["paymentUid"] for r in reservations], username)
+    return [build_reservation_info(r, payments[str(r["paymentUid"])]) for r in reservations]
+
+
+def calculate_prices(stays: list[tuple[date, date, int]], discount_percent: int) -> list[int]:
+    factor = 100 - discount_percent
+    return [price_per_night * (end_date - start_date).days * factor // 100
+            for start_date, end_date, price_per_night in stays]
 
 
 def calculate_price(start_date: date, end_date: date, price_per_night: int, discount_percent: int) -> int:
-    nights: int = (end_date - start_date).days
-    return price_per_night * nights * (100 - discount_percent) // 100
+    return calculate_prices([(start_date, end_date, price_per_night)], discount_percent)[0]
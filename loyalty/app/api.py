@@ -1,58 +1,97 @@
+from typing import List
 from fastapi import APIRouter, Header, Body
-from .db import get_conn
-import psycopg2.extras
+from .batcher import loyalty_batcher
+from .db import database
+from .models import LoyaltyDelta
+from .utils import build_loyalty_from_row
 
 router = APIRouter()
 
 
 @router.get("/manage/health")
-def health():
-    return {"status": "ok"}
+async def health():
+    return {"status": "ok", "pool": database.stats()}
 
 
 @router.get("/api/v1/me")
-def user_loyalty(x_user_name: str = Header(..., alias="X-User-Name")):
-    with get_conn() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("""
+async def user_loyalty(x_user_name: str = Header(..., alias="X-User-Name")):
+    async with database.connection(read_only=True, user=x_user_name) as conn:
+        row = await conn.fetchrow("""
             SELECT *
             FROM loyalty
             WHERE username = %s;
-        """, (x_user_name,))
-        row = cur.fetchone()
+        """, x_user_name)
 
     if not row:
         return {}
 
-    loyalty = {
-        "status": row["status"],
-        "discount": row["discount"],
-        "reservationCount": row["reservation_count"]
-    }
-
-    return loyalty
+    return build_loyalty_from_row(row)
 
 
 @router.patch("/api/v1/loyalty")
-def update_loyalty(
+async def update_loyalty(
         x_user_name: str = Header(..., alias="X-User-Name"),
         delta: int = Body(..., embed=True),
+        idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-            UPDATE loyalty
-            SET 
-                reservation_count = reservation_count + %s,
+    row = await loyalty_batcher.apply(x_user_name, delta, idempotency_key)
+
+    if not row:
+        return {}
+
+    return build_loyalty_from_row(row)
+
+
+@router.post("/api/v1/loyalty/batch")
+async def update_loyalties(updates: List[LoyaltyDelta] = Body(..., embed=True)):
+    if not updates:
+        return {"loyalties": []}
+
+    usernames = [u.username for u in updates]
+    database.mark_write(*usernames)
+    async with database.connection() as conn:
+        await conn.fetch("""
+            SELECT id
+            FROM loyalty
+            WHERE username = ANY(%s)
+            ORDER BY username
+            FOR UPDATE;
+        """, list(set(usernames)))
+        keyed = {u.idempotencyKey: u for u in updates if u.idempotencyKey is not None}
+        if keyed:
+            applied = await conn.fetch("""
+                INSERT INTO loyalty_operation (idempotency_key, username, delta)
+                SELECT *
+                FROM unnest(%s::varchar[], %s::varchar[], %s::int[])
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING idempotency_key;
+            """, list(keyed), [u.username for u in keyed.values()], [u.delta for u in keyed.values()])
+            applied = {row["idempotency_key"] for row in applied}
+            updates = [
+                u for u in updates
+                if u.idempotencyKey is None or (u.idempotencyKey in applied and keyed[u.idempotencyKey] is u)
+            ]
+        rows = await conn.fetch("""
+            UPDATE loyalty AS l
+            SET
+                reservation_count = l.reservation_count + d.delta,
                 status = CASE
-                    WHEN reservation_count + %s < 10 THEN 'BRONZE'
-                    WHEN reservation_count + %s < 20 THEN 'SILVER'
+                    WHEN l.reservation_count + d.delta < 10 THEN 'BRONZE'
+                    WHEN l.reservation_count + d.delta < 20 THEN 'SILVER'
                     ELSE 'GOLD'
                 END
-            WHERE username = %s
-            RETURNING reservation_count, status;
-        """, (delta, delta, delta, x_user_name))
+            FROM (
+                SELECT username, SUM(delta)::int AS delta
+                FROM unnest(%s::varchar[], %s::int[]) AS u(username, delta)
+                GROUP BY username
+            ) AS d
+            WHERE l.username = d.username
+            RETURNING l.username, l.reservation_count, l.status, l.discount;
+        """, [u.username for u in updates], [u.delta for u in updates])
 
-        conn.commit()
+    loyalties = [
+        {"username": row["username"], **build_loyalty_from_row(row)}
+        for row in rows
+    ]
 
-    return {
-        "message": "Loyalty обновлена"
-    }
+    return {"loyalties": loyalties}
@@ -0,0 +1,88 @@
+import asyncio
+import os
+from .db import database
+
+LOYALTY_BATCH_WINDOW = float(os.getenv("LOYALTY_BATCH_WINDOW", "0.005"))
+
+UPDATE_LOYALTY = """
+    UPDATE loyalty
+    SET
+        reservation_count = reservation_count + %s,
+        status = CASE
+            WHEN reservation_count + %s < 10 THEN 'BRONZE'
+            WHEN reservation_count + %s < 20 THEN 'SILVER'
+            ELSE 'GOLD'
+        END
+    WHERE username = %s
+    RETURNING reservation_count, status, discount;
+"""
+
+
+async def record_operations(conn, username: str, operations: list[tuple[int, str | None]]) -> int:
+    keys = {key: delta for delta, key in operations if key is not None}
+    total = sum(delta for delta, key in operations if key is None)
+    if not keys:
+        return total
+
+    applied = await conn.fetch("""
+        INSERT INTO loyalty_operation (idempotency_key, username, delta)
+        SELECT key, %s, delta
+        FROM unnest(%s::varchar[], %s::int[]) AS op(key, delta)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING idempotency_key;
+    """, username, list(keys), list(keys.values()))
+    return total + sum(keys[row["idempotency_key"]] for row in applied)
+
+
+async def apply_operations(username: str, operations: list[tuple[int, str | None]]) -> dict | None:
+    async with database.connection(user=username) as conn:
+        delta = await record_operations(conn, username, operations)
+        if delta == 0:
+            return await conn.fetchrow("""
+                SELECT reservation_count, status, discount
+                FROM loyalty
+                WHERE username = %s;
+            """, username)
+        return await conn.fetchrow(UPDATE_LOYALTY, delta, delta, delta, username)
+
+
+class LoyaltyBatcher:
+    def __init__(self, window: float):
+        self.window = window
+        self.pending: dict[str, list[tuple[int, str | None, asyncio.Future]]] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    async def apply(self, username: str, delta: int, idempotency_key: str | None = None) -> dict | None:
+        if self.window <= 0:
+            return await apply_operations(username, [(delta, idempotency_key)])
+
+        future = asyncio.get_running_loop().create_future()
+        batch = self.pending.get(username)
+        if batch is None:
+            batch = self.pending[username] = []
+            task = asyncio.create_task(self.flush(username))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        batch.append((delta, idempotency_key, future))
+        return await asyncio.shield(future)
+
+    async def flush(self, username: str) -> None:
+        await asyncio.sleep(self.window)
+        batch = self.pending.pop(username)
+        try:
+            row = await apply_operations(username, [(delta, key) for delta, key, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(row)
+
+    async def close(self) -> None:
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+loyalty_batcher = LoyaltyBatcher(LOYALTY_BATCH_WINDOW)
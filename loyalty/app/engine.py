@@ -0,0 +1,149 @@
+import asyncio
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+import psycopg2.extras
+from starlette.concurrency import run_in_threadpool
+
+from .pool import ConnectionPool, PoolTimeout
+
+
+@lru_cache(maxsize=256)
+def to_asyncpg(query: str) -> str:
+    counter = iter(range(1, 1000))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", query)
+
+
+class Psycopg2Connection:
+    def __init__(self, conn):
+        self.raw = conn
+
+    async def fetchrow(self, query: str, *args) -> dict | None:
+        return await run_in_threadpool(self._fetch, query, args, True)
+
+    async def fetch(self, query: str, *args) -> list[dict]:
+        return await run_in_threadpool(self._fetch, query, args, False)
+
+    async def execute(self, query: str, *args) -> int:
+        return await run_in_threadpool(self._execute, query, args)
+
+    def _fetch(self, query: str, args: tuple, one: bool):
+        with self.raw.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(query, args)
+            return cur.fetchone() if one else cur.fetchall()
+
+    def _execute(self, query: str, args: tuple) -> int:
+        with self.raw.cursor() as cur:
+            cur.execute(query, args)
+            return cur.rowcount
+
+
+class Psycopg2Database:
+    engine = "psycopg2"
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    async def open(self) -> None:
+        await run_in_threadpool(self.pool.open)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.pool.close)
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await run_in_threadpool(self.pool.getconn)
+        try:
+            yield Psycopg2Connection(conn)
+            await run_in_threadpool(conn.commit)
+        finally:
+            await run_in_threadpool(self.pool.putconn, conn)
+
+    def stats(self) -> dict:
+        return {"engine": self.engine, **self.pool.stats()}
+
+
+class AsyncpgConnection:
+    def __init__(self, conn):
+        self.raw = conn
+
+    async def fetchrow(self, query: str, *args) -> dict | None:
+        row = await self.raw.fetchrow(to_asyncpg(query), *args)
+        return dict(row.items()) if row is not None else None
+
+    async def fetch(self, query: str, *args) -> list[dict]:
+        rows = await self.raw.fetch(to_asyncpg(query), *args)
+        return [dict(r.items()) for r in rows]
+
+    async def execute(self, query: str, *args) -> int:
+        status = await self.raw.execute(to_asyncpg(query), *args)
+        count = status.rsplit(" ", 1)[-1]
+        return int(count) if count.isdigit() else 0
+
+
+class AsyncpgDatabase:
+    engine = "asyncpg"
+
+    def __init__(self, dsn: str, min_size: int, max_size: int, timeout: float, max_lifetime: float):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._pool = None
+
+    async def open(self) -> None:
+        import asyncpg
+
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            max_inactive_connection_lifetime=self.max_lifetime,
+        )
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        try:
+            conn = await self._pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout("Не удалось получить соединение с БД")
+        try:
+            async with conn.transaction():
+                yield AsyncpgConnection(conn)
+        finally:
+            await self._pool.release(conn)
+
+    def stats(self) -> dict:
+        if self._pool is None:
+            return {"engine": self.engine, "size": 0}
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "engine": self.engine,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+        }
+
+
+def create_database(engine: str, dsn: str, pool: ConnectionPool):
+    if engine == "psycopg2":
+        return Psycopg2Database(pool)
+    if engine == "asyncpg":
+        return AsyncpgDatabase(
+            dsn,
+            min_size=pool.min_size,
+            max_size=pool.max_size,
+            timeout=pool.timeout,
+            max_lifetime=pool.max_lifetime,
+        )
+    raise ValueError(f"Неизвестный DB_ENGINE: {engine}")
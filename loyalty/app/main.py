@@ -1,5 +1,24 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from .api import router
+from .batcher import loyalty_batcher
+from .db import database
+from .pool import PoolTimeout
 
-app = FastAPI(title='Loyalty API')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.open()
+    yield
+    await loyalty_batcher.close()
+    await database.close()
+
+
+app = FastAPI(title='Loyalty API', lifespan=lifespan)
 app.include_router(router)
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"message": str(exc)})
@@ -0,0 +1,131 @@
+import argparse
+import sys
+from pathlib import Path
+
+import psycopg2
+import psycopg2.extras
+
+from .db import DB_DSN
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+LOCK_ID = 8050
+
+HOT_QUERIES = [
+    (
+        "user_loyalty",
+        "SELECT * FROM loyalty WHERE username = %s;",
+        ("Test Max",),
+    ),
+    (
+        "update_loyalty",
+        "UPDATE loyalty SET reservation_count = reservation_count + %s WHERE username = %s;",
+        (1, "Test Max"),
+    ),
+]
+
+psycopg2.extras.register_uuid()
+
+
+def upgrade(dsn: str = DB_DSN) -> list[str]:
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s);", (LOCK_ID,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations
+                (
+                    version    VARCHAR(255) PRIMARY KEY,
+                    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+                );
+            """)
+            conn.commit()
+
+            cur.execute("SELECT version FROM schema_migrations;")
+            done = {row[0] for row in cur.fetchall()}
+
+            applied = []
+            for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+                if path.stem in done:
+                    continue
+                cur.execute(path.read_text())
+                cur.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (path.stem,))
+                conn.commit()
+                applied.append(path.stem)
+
+            cur.execute("SELECT pg_advisory_unlock(%s);", (LOCK_ID,))
+            conn.commit()
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def status(dsn: str = DB_DSN) -> list[tuple[str, bool]]:
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+            done = set()
+            if cur.fetchone()[0]:
+                cur.execute("SELECT version FROM schema_migrations;")
+                done = {row[0] for row in cur.fetchall()}
+        return [(path.stem, path.stem in done) for path in sorted(MIGRATIONS_DIR.glob("*.sql"))]
+    finally:
+        conn.close()
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def check(dsn: str = DB_DSN) -> list[str]:
+    conn = psycopg2.connect(dsn)
+    failures = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET enable_seqscan = off;")
+            for name, query, params in HOT_QUERIES:
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cur.fetchone()[0][0]["Plan"]
+                tables = seq_scans(plan)
+                if tables:
+                    failures.append(f"{name}: Seq Scan on {', '.join(tables)}")
+        conn.rollback()
+    finally:
+        conn.close()
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.migrate")
+    parser.add_argument("command", choices=["upgrade", "status", "check"])
+    parser.add_argument("--dsn", default=DB_DSN)
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        applied = upgrade(args.dsn)
+        print(f"applied: {', '.join(applied)}" if applied else "schema is up to date")
+        return 0
+
+    if args.command == "status":
+        for version, done in status(args.dsn):
+            print(f"{'x' if done else ' '} {version}")
+        return 0
+
+    failures = check(args.dsn)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if not failures:
+        print(f"{len(HOT_QUERIES)} hot queries use indexes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class LoyaltyDelta(BaseModel):
+    username: str
+    delta: int
+    idempotencyKey: str | None = None
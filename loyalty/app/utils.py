@@ -0,0 +1,9 @@
+from typing import Dict, Any
+
+
+def build_loyalty_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": row["status"],
+        "discount": row["discount"],
+        "reservationCount": row["reservation_count"]
+    }
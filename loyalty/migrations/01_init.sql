@@ -1,4 +1,4 @@
-CREATE TABLE loyalty
+CREATE TABLE IF NOT EXISTS loyalty
 (
     id                SERIAL PRIMARY KEY,
     username          VARCHAR(80) NOT NULL UNIQUE,
@@ -0,0 +1 @@
+CREATE UNIQUE INDEX IF NOT EXISTS loyalty_username_key ON loyalty (username);
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS loyalty_operation
+(
+    idempotency_key VARCHAR(255) PRIMARY KEY,
+    username        VARCHAR(80) NOT NULL,
+    delta           INT         NOT NULL,
+    created_at      TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
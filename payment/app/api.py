@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Body, HTTPException, Response
-from .db import get_conn
+from fastapi import APIRouter, Body, Header, HTTPException, Response
+from .db import database
 import psycopg2.extras
+from typing import List
 from uuid import UUID, uuid4
 
 router = APIRouter()
@@ -8,19 +9,25 @@ psycopg2.extras.register_uuid()
 
 
 @router.get("/manage/health")
-def health():
-    return {"status": "ok"}
+async def health():
+    return {"status": "ok", "pool": database.stats()}
 
 
 @router.get("/api/v1/payments/{paymentUid}")
-def payment_by_id(paymentUid: UUID):
-    with get_conn() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("""
-            SELECT *
-            FROM payment
-            WHERE payment_uid = %s;
-        """, (paymentUid,))
-        row = cur.fetchone()
+async def payment_by_id(
+        paymentUid: UUID,
+        x_user_name: str | None = Header(None, alias="X-User-Name"),
+):
+    query = """
+        SELECT *
+        FROM payment
+        WHERE payment_uid = %s;
+    """
+    async with database.connection(read_only=True, user=x_user_name) as conn:
+        row = await conn.fetchrow(query, paymentUid)
+    if not row:
+        async with database.connection() as conn:
+            row = await conn.fetchrow(query, paymentUid)
 
     if not row:
         return {}
@@ -33,42 +40,161 @@ def payment_by_id(paymentUid: UUID):
     return payment
 
 
+@router.post("/api/v1/payments/batch")
+async def payments_by_ids(
+        paymentUids: List[UUID] = Body(..., embed=True),
+        x_user_name: str | None = Header(None, alias="X-User-Name"),
+):
+    if not paymentUids:
+        return {"payments": []}
+
+    query = """
+        SELECT payment_uid, status, price
+        FROM payment
+        WHERE payment_uid = ANY(%s);
+    """
+    uids = set(paymentUids)
+    async with database.connection(read_only=True, user=x_user_name) as conn:
+        rows = await conn.fetch(query, list(uids))
+    if len(rows) < len(uids):
+        missing = uids - {row["payment_uid"] for row in rows}
+        async with database.connection() as conn:
+            rows += await conn.fetch(query, list(missing))
+
+    payments = [
+        {
+            "paymentUid": row["payment_uid"],
+            "status": row["status"],
+            "price": row["price"]
+        }
+        for row in rows
+    ]
+
+    return {"payments": payments}
+
+
 @router.post("/api/v1/payments")
-def create_payment(price: int = Body(..., embed=True)):
+async def create_payment(
+        price: int = Body(..., embed=True),
+        x_user_name: str | None = Header(None, alias="X-User-Name"),
+        idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
     payment_uid: UUID = uuid4()
 
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
+    async with database.connection(user=x_user_name) as conn:
+        row = await conn.fetchrow(
             """
-            INSERT INTO payment (payment_uid, status, price)
-            VALUES (%s, %s, %s)
+            INSERT INTO payment (payment_uid, status, price, idempotency_key)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING payment_uid, status, price;
             """,
-            (payment_uid, "PAID", price),
+            payment_uid, "PAID", price, idempotency_key,
         )
-        conn.commit()
+        if row is None:
+            row = await conn.fetchrow(
+                """
+                SELECT payment_uid, status, price
+                FROM payment
+                WHERE idempotency_key = %s;
+                """,
+                idempotency_key,
+            )
 
     payment = {
-        "paymentUid": payment_uid,
-        "status": "PAID",
-        "price": price,
+        "paymentUid": row["payment_uid"],
+        "status": row["status"],
+        "price": row["price"],
     }
 
     return payment
 
 
+@router.post("/api/v1/payments/bulk")
+async def create_payments(
+        prices: List[int] = Body(..., embed=True),
+        x_user_name: str | None = Header(None, alias="X-User-Name"),
+        idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
+    if not prices:
+        return {"payments": []}
+
+    payment_uids = [uuid4() for _ in prices]
+    keys = [f"{idempotency_key}:{i}" if idempotency_key else None for i in range(len(prices))]
+
+    async with database.connection(user=x_user_name) as conn:
+        rows = await conn.fetch(
+            """
+            INSERT INTO payment (payment_uid, status, price, idempotency_key)
+            SELECT payment_uid, 'PAID', price, idempotency_key
+            FROM unnest(%s::uuid[], %s::int[], %s::varchar[]) AS p(payment_uid, price, idempotency_key)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING payment_uid, status, price, idempotency_key;
+            """,
+            payment_uids, prices, keys,
+        )
+        if idempotency_key and len(rows) < len(prices):
+            rows = await conn.fetch(
+                """
+                SELECT payment_uid, status, price, idempotency_key
+                FROM payment
+                WHERE idempotency_key = ANY(%s);
+                """,
+                keys,
+            )
+
+    if idempotency_key:
+        by_key = {row["idempotency_key"]: row for row in rows}
+        rows = [by_key[key] for key in keys]
+    else:
+        by_uid = {row["payment_uid"]: row for row in rows}
+        rows = [by_uid[uid] for uid in payment_uids]
+
+    payments = [
+        {
+            "paymentUid": row["payment_uid"],
+            "status": row["status"],
+            "price": row["price"],
+        }
+        for row in rows
+    ]
+
+    return {"payments": payments}
+
+
+@router.post("/api/v1/payments/cancel")
+async def cancel_payments(
+        paymentUids: List[UUID] = Body(..., embed=True),
+        x_user_name: str | None = Header(None, alias="X-User-Name"),
+):
+    if not paymentUids:
+        return {"canceled": []}
+
+    async with database.connection(user=x_user_name) as conn:
+        rows = await conn.fetch("""
+            UPDATE payment
+            SET status = 'CANCELED'
+            WHERE payment_uid = ANY(%s)
+            RETURNING payment_uid;
+        """, list(set(paymentUids)))
+
+    return {"canceled": [row["payment_uid"] for row in rows]}
+
+
 @router.patch("/api/v1/payments/{paymentUid}/cancel")
-def cancel_payment(paymentUid: UUID):
-    with get_conn() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(
+async def cancel_payment(
+        paymentUid: UUID,
+        x_user_name: str | None = Header(None, alias="X-User-Name"),
+):
+    async with database.connection(user=x_user_name) as conn:
+        updated = await conn.execute(
             """
             UPDATE payment 
             SET status = 'CANCELED'
             WHERE payment_uid = %s
-            """, (paymentUid,)
+            """, paymentUid
         )
-        if cur.rowcount == 0:
+        if updated == 0:
             raise HTTPException(status_code=404, detail="Запись не найдена")
 
-        conn.commit()
-
     return Response(status_code=204)
@@ -0,0 +1 @@
+CREATE UNIQUE INDEX IF NOT EXISTS payment_payment_uid_key ON payment (payment_uid);
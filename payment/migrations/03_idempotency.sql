@@ -0,0 +1,3 @@
+ALTER TABLE payment ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+
+CREATE UNIQUE INDEX IF NOT EXISTS payment_idempotency_key_key ON payment (idempotency_key);
@@ -0,0 +1,4 @@
+#!/usr/bin/env bash
+set -e
+
+echo "host replication all all md5" >> "$PGDATA/pg_hba.conf"
@@ -1,76 +1,243 @@
+import os
+import time
+from datetime import date, datetime
+from typing import List
 from fastapi import APIRouter, Header, Body, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from uuid import uuid4
 from .models import *
 import psycopg2.extras
-from .db import get_conn
+from .db import database, get_conn
+from .outbox import enqueue_compensations, outbox_worker
 from .utils import *
 
 router = APIRouter()
 psycopg2.extras.register_uuid()
 
+EXPORT_ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", "2000"))
+HOTELS_TOTAL_TTL = float(os.getenv("HOTELS_TOTAL_TTL", "30"))
+SEARCH_TOTAL_CAP = int(os.getenv("SEARCH_TOTAL_CAP", "1000"))
+_hotels_total = {"value": None, "expires": 0.0}
+
+
+async def hotels_total(conn) -> int:
+    if _hotels_total["value"] is not None and time.monotonic() < _hotels_total["expires"]:
+        return _hotels_total["value"]
+
+    total = (await conn.fetchrow("SELECT COUNT(*) AS total FROM hotels;"))["total"]
+
+    _hotels_total["value"] = total
+    _hotels_total["expires"] = time.monotonic() + HOTELS_TOTAL_TTL
+    return total
+
 
 @router.get("/manage/health")
-def health():
-    return {"status": "ok"}
+async def health():
+    return {"status": "ok", "pool": database.stats(), "outbox": outbox_worker.stats()}
 
 
 @router.get("/api/v1/hotels")
-def list_hotels(params: GetHotelsQuery = Depends()):
-    if not params.page:
-        params.page = 1
-    offset = (params.page - 1) * params.size
-    with get_conn() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("SELECT COUNT(*) AS total FROM hotels;")
-        total = cur.fetchone()["total"]
-
-        cur.execute(
-            """
+async def list_hotels(params: GetHotelsQuery = Depends()):
+    if params.cursor:
+        try:
+            after_id = int(decode_cursor(params.cursor)["id"])
+        except Exception:
+            raise HTTPException(status_code=400, detail="Неверный курсор")
+        query = """
+            SELECT *
+            FROM hotels
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s;
+        """
+        args = (after_id, params.size + 1)
+    else:
+        if not params.page:
+            params.page = 1
+        query = """
             SELECT *
             FROM hotels
             ORDER BY id
             LIMIT %s OFFSET %s;
-            """,
-            (params.size, offset),
-        )
-        rows = cur.fetchall()
+        """
+        args = (params.size + 1, (params.page - 1) * params.size)
+
+    async with database.connection(read_only=True) as conn:
+        total = await hotels_total(conn)
+        rows = await conn.fetch(query, *args)
+
+    next_cursor = None
+    if len(rows) > params.size:
+        rows = rows[:params.size]
+        next_cursor = encode_cursor({"id": rows[-1]["id"]})
 
     items = [build_hotel_from_row(r) for r in rows]
-    return {"total": total, "items": items}
+    return {"total": total, "items": items, "nextCursor": next_cursor}
+
+
+HOTEL_SEARCH_ORDER = {
+    "price": "price ASC, id ASC",
+    "-price": "price DESC, id DESC",
+    "stars": "stars ASC, price ASC, id ASC",
+    "-stars": "stars DESC, price ASC, id ASC",
+}
+
+
+@router.get("/api/v1/hotels/search")
+async def search_hotels(params: SearchHotelsQuery = Depends()):
+    conditions, args = [], []
+    if params.q:
+        pattern = escape_like(params.q) + "%"
+        conditions.append("(name ILIKE %s OR city ILIKE %s)")
+        args += [pattern, pattern]
+    for column, op, value in (
+            ("city", "=", params.city),
+            ("country", "=", params.country),
+            ("stars", ">=", params.minStars),
+            ("stars", "<=", params.maxStars),
+            ("price", ">=", params.minPrice),
+            ("price", "<=", params.maxPrice),
+    ):
+        if value is not None:
+            conditions.append(f"{column} {op} %s")
+            args.append(value)
+
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    offset = (params.page - 1) * params.size
+    async with database.connection(read_only=True) as conn:
+        rows = await conn.fetch(f"""
+            SELECT *
+            FROM hotels
+            {where}
+            ORDER BY {HOTEL_SEARCH_ORDER[params.sort]}
+            LIMIT %s OFFSET %s;
+        """, *args, params.size + 1, offset)
+
+        has_more = len(rows) > params.size
+        rows = rows[:params.size]
+        if not offset and not has_more:
+            total = len(rows)
+        else:
+            total = (await conn.fetchrow(f"""
+                SELECT COUNT(*) AS total
+                FROM (SELECT 1 FROM hotels {where} LIMIT %s) AS matched;
+            """, *args, SEARCH_TOTAL_CAP + 1))["total"]
 
+    items = [build_hotel_from_row(r) for r in rows]
+    total_capped = total > SEARCH_TOTAL_CAP
+    return {
+        "total": min(total, SEARCH_TOTAL_CAP),
+        "totalCapped": total_capped,
+        "hasMore": has_more,
+        "items": items,
+    }
 
-@router.get("/api/v1/me")
-def user_reservations(x_user_name: str = Header(..., alias="X-User-Name")):
-    with get_conn() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(
-            """
-            SELECT reservation.*, hotels.*
-            FROM reservation
-            JOIN hotels ON reservation.hotel_id = hotels.id
-            WHERE reservation.username = %s;
-            """,
-            (x_user_name,),
-        )
-        rows = cur.fetchall()
 
-    if not rows:
-        return {"reservations": []}
+@router.get("/api/v1/hotels/available")
+async def available_hotels(params: AvailableHotelsQuery = Depends()):
+    if params.endDate <= params.startDate:
+        raise HTTPException(status_code=400, detail="Дата выезда должна быть позже даты заезда")
+
+    offset = (params.page - 1) * params.size
+    async with database.connection(read_only=True) as conn:
+        rows = await conn.fetch("""
+            SELECT hotels.*, COUNT(*) OVER () AS total
+            FROM hotels
+            WHERE hotels.city = %s
+              AND NOT EXISTS (
+                SELECT 1
+                FROM reservation
+                WHERE reservation.hotel_id = hotels.id
+                  AND reservation.status <> 'CANCELED'
+                  AND reservation.stay && daterange(%s, %s, '[)')
+              )
+            ORDER BY hotels.price, hotels.id
+            LIMIT %s OFFSET %s;
+        """, params.city, params.startDate, params.endDate, params.size, offset)
+
+    items = [build_hotel_from_row(r) for r in rows]
+    return {"total": rows[0]["total"] if rows else 0, "items": items}
+
+
+@router.get("/api/v1/me")
+async def user_reservations(
+        x_user_name: str = Header(..., alias="X-User-Name"),
+        params: UserReservationsQuery = Depends(),
+):
+    conditions, args = ["reservation.username = %s"], [x_user_name]
+    if params.status:
+        conditions.append("reservation.status = %s")
+        args.append(params.status)
+
+    paginated = params.size is not None or params.cursor is not None
+    if params.cursor:
+        try:
+            cursor = decode_cursor(params.cursor)
+            cursor_id = int(cursor["id"])
+            if cursor["startDate"] is None:
+                conditions.append("(reservation.start_date IS NOT NULL OR reservation.id < %s)")
+                args.append(cursor_id)
+            else:
+                conditions.append("(reservation.start_date, reservation.id) < (%s::timestamptz, %s)")
+                args += [datetime.fromisoformat(cursor["startDate"]), cursor_id]
+        except Exception:
+            raise HTTPException(status_code=400, detail="Неверный курсор")
+
+    query = f"""
+        SELECT reservation.*, hotels.*, reservation.id AS reservation_id
+        FROM reservation
+        JOIN hotels ON reservation.hotel_id = hotels.id
+        WHERE {" AND ".join(conditions)}
+    """
+    if paginated:
+        size = params.size or 10
+        query += " ORDER BY reservation.start_date DESC NULLS FIRST, reservation.id DESC LIMIT %s"
+        args.append(size + 1)
+
+    async with database.connection(read_only=True, user=x_user_name) as conn:
+        rows = await conn.fetch(query + ";", *args)
+
+    next_cursor = None
+    if paginated and len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor({
+            "startDate": last["start_date"].isoformat() if last["start_date"] else None,
+            "id": last["reservation_id"],
+        })
 
     reservations = [build_reservation_from_row(r) for r in rows]
+    if paginated:
+        return {"reservations": reservations, "nextCursor": next_cursor}
     return {"reservations": reservations}
 
 
+@router.post("/api/v1/hotels/batch")
+async def hotels_by_ids(hotelUids: List[UUID] = Body(..., embed=True)):
+    if not hotelUids:
+        return {"hotels": []}
+
+    async with database.connection(read_only=True) as conn:
+        rows = await conn.fetch("""
+            SELECT *
+            FROM hotels
+            WHERE hotel_uid = ANY(%s);
+        """, list(set(hotelUids)))
+
+    return {"hotels": [build_hotel_from_row(r) for r in rows]}
+
+
 @router.get("/api/v1/hotel/{hotelUid}")
-def get_hotel(hotelUid: UUID):
-    with get_conn() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(
+async def get_hotel(hotelUid: UUID):
+    async with database.connection(read_only=True) as conn:
+        row = await conn.fetchrow(
             """
             SELECT *
             FROM hotels
             WHERE hotel_uid = %s;
             """,
-            (hotelUid,),
+            hotelUid,
         )
-        row = cur.fetchone()
 
     if not row:
         return {}
@@ -79,9 +246,10 @@ def get_hotel(hotelUid: UUID):
 
 
 @router.post("/api/v1/reservations")
-def create_reservation(
+async def create_reservation(
         x_user_name: str = Header(..., alias="X-User-Name"),
         body: dict = Body(...),
+        idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
     reservation_uid = uuid4()
 
@@ -101,20 +269,28 @@ def create_reservation(
             detail="Не хватает обязательных полей для создания бронирования",
         )
 
-    with get_conn() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("SELECT id FROM hotels WHERE hotel_uid = %s;", (hotel_uid,))
-        hotel_row = cur.fetchone()
+    try:
+        start_date = date.fromisoformat(start_date)
+        end_date = date.fromisoformat(end_date)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Неверный формат даты")
+    if end_date <= start_date:
+        raise HTTPException(status_code=400, detail="Дата выезда должна быть позже даты заезда")
+
+    async with database.connection(user=x_user_name) as conn:
+        hotel_row = await conn.fetchrow("SELECT id FROM hotels WHERE hotel_uid = %s;", hotel_uid)
         if not hotel_row:
             raise HTTPException(status_code=400, detail="Отель не найден")
 
-        cur.execute(
-            """
-            INSERT INTO reservation
-                (reservation_uid, username, payment_uid, hotel_id, status, start_date, end_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING reservation_uid, status, start_date, end_date;
-            """,
-            (
+        try:
+            row = await conn.fetchrow(
+                """
+                INSERT INTO reservation
+                    (reservation_uid, username, payment_uid, hotel_id, status, start_date, end_date, idempotency_key)
+                VALUES (%s, %s, %s, %s, %s, %s::date, %s::date, %s)
+                ON CONFLICT (username, idempotency_key) DO NOTHING
+                RETURNING reservation_uid, status, start_date, end_date;
+                """,
                 reservation_uid,
                 x_user_name,
                 payment_uid,
@@ -122,30 +298,175 @@ def create_reservation(
                 status_value,
                 start_date,
                 end_date,
-            ),
-        )
-        row = cur.fetchone()
-        conn.commit()
+                idempotency_key,
+            )
+        except Exception as e:
+            if is_exclusion_violation(e):
+                raise HTTPException(status_code=409, detail="Отель уже забронирован на эти даты")
+            raise
+        if row is None:
+            row = await conn.fetchrow(
+                """
+                SELECT reservation.reservation_uid, reservation.status, reservation.start_date,
+                       reservation.end_date, reservation.payment_uid, hotels.hotel_uid
+                FROM reservation
+                JOIN hotels ON reservation.hotel_id = hotels.id
+                WHERE reservation.username = %s
+                  AND reservation.idempotency_key = %s;
+                """,
+                x_user_name,
+                idempotency_key,
+            )
+            return build_created_reservation_response(row, row["hotel_uid"], row["payment_uid"])
 
     return build_created_reservation_response(row, hotel_uid, payment_uid)
 
 
+def export_reservations_rows(params: ExportReservationsQuery):
+    conditions, args = [], []
+    for column, op, value in (
+            ("reservation.username", "=", params.username),
+            ("hotels.hotel_uid", "=", params.hotelUid),
+            ("reservation.status", "=", params.status),
+            ("reservation.start_date", ">=", params.startFrom),
+            ("reservation.start_date", "<", params.startTo),
+    ):
+        if value is not None:
+            conditions.append(f"{column} {op} %s")
+            args.append(value)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    with get_conn(read_only=True) as conn:
+        with conn.cursor(name=f"export_{uuid4().hex}") as cur:
+            cur.itersize = EXPORT_ITERSIZE
+            cur.execute(f"""
+                SELECT reservation.reservation_uid, reservation.username, hotels.hotel_uid,
+                       reservation.payment_uid, reservation.status, reservation.start_date, reservation.end_date
+                FROM reservation
+                JOIN hotels ON reservation.hotel_id = hotels.id
+                {where}
+                ORDER BY reservation.id;
+            """, args)
+
+            if params.format == "csv":
+                yield encode_csv([], header=True)
+            while True:
+                rows = cur.fetchmany(EXPORT_ITERSIZE)
+                if not rows:
+                    break
+                yield encode_csv(rows) if params.format == "csv" else encode_ndjson(rows)
+
+
+@router.get("/api/v1/reservations/export")
+async def export_reservations(params: ExportReservationsQuery = Depends()):
+    media_type = "text/csv" if params.format == "csv" else "application/x-ndjson"
+    return StreamingResponse(export_reservations_rows(params), media_type=media_type)
+
+
+@router.post("/api/v1/reservations/bulk")
+async def create_reservations(
+        x_user_name: str = Header(..., alias="X-User-Name"),
+        reservations: List[dict] = Body(..., embed=True),
+        idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
+    results: list[dict | None] = [None] * len(reservations)
+    items = []
+    for i, item in enumerate(reservations):
+        try:
+            parsed = (
+                i,
+                UUID(item["hotelUid"]),
+                UUID(item["paymentUid"]),
+                date.fromisoformat(item["startDate"]),
+                date.fromisoformat(item["endDate"]),
+                item["status"],
+                int(item.get("index", i)),
+            )
+        except (KeyError, TypeError, ValueError):
+            results[i] = {"code": 400, "message": "Неверный формат бронирования"}
+            continue
+        if parsed[4] <= parsed[3]:
+            results[i] = {"code": 400, "message": "Дата выезда должна быть позже даты заезда"}
+            continue
+        items.append(parsed)
+
+    if not items:
+        return {"results": results}
+
+    async with database.connection(user=x_user_name) as conn:
+        hotel_rows = await conn.fetch(
+            "SELECT id, hotel_uid FROM hotels WHERE hotel_uid = ANY(%s);",
+            list({item[1] for item in items}),
+        )
+        hotel_ids = {row["hotel_uid"]: row["id"] for row in hotel_rows}
+
+        rows_to_insert = []
+        for i, hotel_uid, payment_uid, start_date, end_date, status_value, index in items:
+            if hotel_uid not in hotel_ids:
+                results[i] = {"code": 400, "message": "Отель не найден"}
+                continue
+            rows_to_insert.append((
+                i, uuid4(), payment_uid, hotel_ids[hotel_uid], status_value, start_date, end_date,
+                f"{idempotency_key}:{index}" if idempotency_key else None, hotel_uid,
+            ))
+
+        inserted = []
+        if rows_to_insert:
+            columns = list(zip(*rows_to_insert))
+            inserted = await conn.fetch(
+                """
+                INSERT INTO reservation
+                    (reservation_uid, username, payment_uid, hotel_id, status, start_date, end_date, idempotency_key)
+                SELECT r.reservation_uid, %s, r.payment_uid, r.hotel_id, r.status, r.start_date, r.end_date,
+                       r.idempotency_key
+                FROM unnest(%s::uuid[], %s::uuid[], %s::int[], %s::varchar[], %s::date[], %s::date[], %s::varchar[])
+                    AS r(reservation_uid, payment_uid, hotel_id, status, start_date, end_date, idempotency_key)
+                ON CONFLICT DO NOTHING
+                RETURNING reservation_uid, payment_uid, status, start_date, end_date;
+                """,
+                x_user_name, *(list(column) for column in columns[1:8]),
+            )
+
+        created = {row["payment_uid"]: row for row in inserted}
+        missing = [r for r in rows_to_insert if r[2] not in created]
+        if idempotency_key and missing:
+            existing = await conn.fetch(
+                """
+                SELECT reservation_uid, payment_uid, status, start_date, end_date
+                FROM reservation
+                WHERE username = %s
+                  AND idempotency_key = ANY(%s);
+                """,
+                x_user_name,
+                [r[7] for r in missing],
+            )
+            created.update({row["payment_uid"]: row for row in existing})
+
+    for i, _, payment_uid, _, _, _, _, _, hotel_uid in rows_to_insert:
+        row = created.get(payment_uid)
+        if row is None:
+            results[i] = {"code": 409, "message": "Отель уже забронирован на эти даты"}
+        else:
+            results[i] = {"code": 200, **build_created_reservation_response(row, hotel_uid, payment_uid)}
+
+    return {"results": results}
+
+
 @router.get("/api/v1/reservations/{reservationUid}")
-def get_reservation(
+async def get_reservation(
         reservationUid: UUID,
         x_user_name: str = Header(..., alias="X-User-Name"),
 ):
-    with get_conn() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(
+    async with database.connection(read_only=True, user=x_user_name) as conn:
+        row = await conn.fetchrow(
             """
             SELECT reservation.*, hotels.*
             FROM reservation
             JOIN hotels ON reservation.hotel_id = hotels.id
             WHERE reservation.reservation_uid = %s;
             """,
-            (reservationUid,),
+            reservationUid,
         )
-        row = cur.fetchone()
 
     if not row or row["username"] != x_user_name:
         raise HTTPException(status_code=404, detail="Билет не найден")
@@ -154,21 +475,32 @@ def get_reservation(
 
 
 @router.patch("/api/v1/reservations/{reservationUid}/cancel", status_code=204)
-def cancel_reservation(
+async def cancel_reservation(
         reservationUid: UUID,
         x_user_name: str = Header(..., alias="X-User-Name")
 ):
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
+    async with database.connection(user=x_user_name) as conn:
+        row = await conn.fetchrow("""
             UPDATE reservation
             SET status = 'CANCELED'
             WHERE reservation_uid = %s
-              AND username = %s;
-        """, (reservationUid, x_user_name))
-
-        if cur.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Бронь не найдена")
-
-        conn.commit()
-
+              AND username = %s
+              AND status <> 'CANCELED'
+            RETURNING payment_uid;
+        """, reservationUid, x_user_name)
+
+        if row is None:
+            exists = await conn.fetchrow("""
+                SELECT 1
+                FROM reservation
+                WHERE reservation_uid = %s
+                  AND username = %s;
+            """, reservationUid, x_user_name)
+            if not exists:
+                raise HTTPException(status_code=404, detail="Бронь не найдена")
+            return Response(status_code=204)
+
+        await enqueue_compensations(conn, reservationUid, row["payment_uid"], x_user_name)
+
+    outbox_worker.notify()
     return Response(status_code=204)
@@ -1,5 +1,25 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from .api import router
+from .db import database
+from .outbox import outbox_worker
+from .pool import PoolTimeout
 
-app = FastAPI(title='Reservation API')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.open()
+    await outbox_worker.open()
+    yield
+    await outbox_worker.close()
+    await database.close()
+
+
+app = FastAPI(title='Reservation API', lifespan=lifespan)
 app.include_router(router)
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"message": str(exc)})
@@ -0,0 +1,255 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+from datetime import date, datetime, timezone
+from uuid import uuid4
+
+import psycopg2
+import psycopg2.extras
+
+from .db import DB_DSN
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+LOCK_ID = 8070
+BOOKING_EXCLUSION = os.getenv("BOOKING_EXCLUSION", "false").lower() in ("1", "true", "yes")
+
+HOT_QUERIES = [
+    (
+        "list_hotels",
+        "SELECT * FROM hotels ORDER BY id LIMIT %s OFFSET %s;",
+        (10, 0),
+    ),
+    (
+        "list_hotels_cursor",
+        "SELECT * FROM hotels WHERE id > %s ORDER BY id LIMIT %s;",
+        (1, 10),
+    ),
+    (
+        "search_hotels_city",
+        """
+        SELECT *
+        FROM hotels
+        WHERE city = %s AND price <= %s
+        ORDER BY price ASC, id ASC
+        LIMIT %s OFFSET %s;
+        """,
+        ("Москва", 20000, 10, 0),
+    ),
+    (
+        "search_hotels_prefix",
+        """
+        SELECT *
+        FROM hotels
+        WHERE (name ILIKE %s OR city ILIKE %s)
+        ORDER BY price ASC, id ASC
+        LIMIT %s OFFSET %s;
+        """,
+        ("Ara%", "Ara%", 10, 0),
+    ),
+    (
+        "available_hotels",
+        """
+        SELECT hotels.*, COUNT(*) OVER () AS total
+        FROM hotels
+        WHERE hotels.city = %s
+          AND NOT EXISTS (
+            SELECT 1
+            FROM reservation
+            WHERE reservation.hotel_id = hotels.id
+              AND reservation.status <> 'CANCELED'
+              AND reservation.stay && daterange(%s, %s, '[)')
+          )
+        ORDER BY hotels.price, hotels.id
+        LIMIT %s OFFSET %s;
+        """,
+        ("Москва", date(2030, 1, 1), date(2030, 1, 5), 10, 0),
+    ),
+    (
+        "get_hotel",
+        "SELECT * FROM hotels WHERE hotel_uid = %s;",
+        (uuid4(),),
+    ),
+    (
+        "user_reservations",
+        """
+        SELECT reservation.*, hotels.*
+        FROM reservation
+        JOIN hotels ON reservation.hotel_id = hotels.id
+        WHERE reservation.username = %s;
+        """,
+        ("Test Max",),
+    ),
+    (
+        "user_reservations_page",
+        """
+        SELECT reservation.*, hotels.*, reservation.id AS reservation_id
+        FROM reservation
+        JOIN hotels ON reservation.hotel_id = hotels.id
+        WHERE reservation.username = %s
+          AND (reservation.start_date, reservation.id) < (%s::timestamptz, %s)
+        ORDER BY reservation.start_date DESC, reservation.id DESC
+        LIMIT %s;
+        """,
+        ("Test Max", datetime(2030, 1, 1, tzinfo=timezone.utc), 2 ** 31 - 1, 11),
+    ),
+    (
+        "get_reservation",
+        """
+        SELECT reservation.*, hotels.*
+        FROM reservation
+        JOIN hotels ON reservation.hotel_id = hotels.id
+        WHERE reservation.reservation_uid = %s;
+        """,
+        (uuid4(),),
+    ),
+    (
+        "cancel_reservation",
+        """
+        UPDATE reservation
+        SET status = 'CANCELED'
+        WHERE reservation_uid = %s AND username = %s AND status <> 'CANCELED'
+        RETURNING payment_uid;
+        """,
+        (uuid4(), "Test Max"),
+    ),
+    (
+        "claim_outbox",
+        """
+        SELECT id
+        FROM outbox
+        WHERE available_at <= now()
+        ORDER BY available_at, id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED;
+        """,
+        (100,),
+    ),
+]
+
+psycopg2.extras.register_uuid()
+
+
+def sync_booking_exclusion(cur, enabled: bool) -> None:
+    if enabled:
+        cur.execute("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'reservation_no_overlap') THEN
+                    ALTER TABLE reservation ADD CONSTRAINT reservation_no_overlap
+                        EXCLUDE USING gist (hotel_id WITH =, stay WITH &&)
+                        WHERE (status <> 'CANCELED');
+                END IF;
+            END
+            $$;
+        """)
+    else:
+        cur.execute("ALTER TABLE reservation DROP CONSTRAINT IF EXISTS reservation_no_overlap;")
+
+
+def upgrade(dsn: str = DB_DSN) -> list[str]:
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s);", (LOCK_ID,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations
+                (
+                    version    VARCHAR(255) PRIMARY KEY,
+                    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+                );
+            """)
+            conn.commit()
+
+            cur.execute("SELECT version FROM schema_migrations;")
+            done = {row[0] for row in cur.fetchall()}
+
+            applied = []
+            for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+                if path.stem in done:
+                    continue
+                cur.execute(path.read_text())
+                cur.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (path.stem,))
+                conn.commit()
+                applied.append(path.stem)
+
+            sync_booking_exclusion(cur, BOOKING_EXCLUSION)
+            conn.commit()
+
+            cur.execute("SELECT pg_advisory_unlock(%s);", (LOCK_ID,))
+            conn.commit()
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def status(dsn: str = DB_DSN) -> list[tuple[str, bool]]:
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+            done = set()
+            if cur.fetchone()[0]:
+                cur.execute("SELECT version FROM schema_migrations;")
+                done = {row[0] for row in cur.fetchall()}
+        return [(path.stem, path.stem in done) for path in sorted(MIGRATIONS_DIR.glob("*.sql"))]
+    finally:
+        conn.close()
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def check(dsn: str = DB_DSN) -> list[str]:
+    conn = psycopg2.connect(dsn)
+    failures = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET enable_seqscan = off;")
+            for name, query, params in HOT_QUERIES:
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cur.fetchone()[0][0]["Plan"]
+                tables = seq_scans(plan)
+                if tables:
+                    failures.append(f"{name}: Seq Scan on {', '.join(tables)}")
+        conn.rollback()
+    finally:
+        conn.close()
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.migrate")
+    parser.add_argument("command", choices=["upgrade", "status", "check"])
+    parser.add_argument("--dsn", default=DB_DSN)
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        applied = upgrade(args.dsn)
+        print(f"applied: {', '.join(applied)}" if applied else "schema is up to date")
+        return 0
+
+    if args.command == "status":
+        for version, done in status(args.dsn):
+            print(f"{'x' if done else ' '} {version}")
+        return 0
+
+    failures = check(args.dsn)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if not failures:
+        print(f"{len(HOT_QUERIES)} hot queries use indexes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+from datetime import date
 from uuid import UUID
 from pydantic import BaseModel, Field
 
@@ -11,3 +12,40 @@ class CreateReservationRequest(BaseModel):
 class GetHotelsQuery(BaseModel):
     page: int = Field(0, ge=0)
     size: int = Field(1, ge=1, le=100)
+    cursor: str | None = None
+
+
+class SearchHotelsQuery(BaseModel):
+    q: str | None = Field(None, min_length=3, max_length=80)
+    city: str | None = None
+    country: str | None = None
+    minStars: int | None = Field(None, ge=1, le=5)
+    maxStars: int | None = Field(None, ge=1, le=5)
+    minPrice: int | None = Field(None, ge=0)
+    maxPrice: int | None = Field(None, ge=0)
+    sort: str = Field("price", pattern="^-?(price|stars)$")
+    page: int = Field(1, ge=1)
+    size: int = Field(10, ge=1, le=100)
+
+
+class AvailableHotelsQuery(BaseModel):
+    city: str
+    startDate: date
+    endDate: date
+    page: int = Field(1, ge=1)
+    size: int = Field(10, ge=1, le=100)
+
+
+class ExportReservationsQuery(BaseModel):
+    format: str = Field("ndjson", pattern="^(ndjson|csv)$")
+    username: str | None = None
+    hotelUid: UUID | None = None
+    status: str | None = Field(None, pattern="^(PAID|CANCELED)$")
+    startFrom: date | None = None
+    startTo: date | None = None
+
+
+class UserReservationsQuery(BaseModel):
+    size: int | None = Field(None, ge=1, le=100)
+    cursor: str | None = None
+    status: str | None = Field(None, pattern="^(PAID|RESERVED|CANCELED)$")
@@ -0,0 +1,135 @@
+import asyncio
+import os
+from contextlib import suppress
+from uuid import UUID
+
+import httpx
+
+from .db import database
+
+PAYMENT_URL = os.getenv("PAYMENT_URL", "http://payment:8060")
+LOYALTY_URL = os.getenv("LOYALTY_URL", "http://loyalty:8050")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "30"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "300"))
+OUTBOX_TIMEOUT = float(os.getenv("OUTBOX_TIMEOUT", "5.0"))
+
+CLAIM_OUTBOX = """
+    UPDATE outbox
+    SET available_at = now() + make_interval(secs => %s),
+        attempts = attempts + 1
+    WHERE id IN (
+        SELECT id
+        FROM outbox
+        WHERE available_at <= now()
+        ORDER BY available_at, id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, reservation_uid, payment_uid, username, delta;
+"""
+
+
+async def enqueue_compensations(conn, reservation_uid: UUID, payment_uid: UUID, username: str) -> None:
+    await conn.execute("""
+        INSERT INTO outbox (kind, reservation_uid, payment_uid, username, delta)
+        VALUES ('PAYMENT_CANCEL', %s, %s, NULL, NULL),
+               ('LOYALTY_DELTA', %s, NULL, %s, -1)
+        ON CONFLICT (kind, reservation_uid) DO NOTHING;
+    """, reservation_uid, payment_uid, reservation_uid, username)
+
+
+class OutboxWorker:
+    def __init__(self, batch_size: int, poll_interval: float, lease: float, max_backoff: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_backoff = max_backoff
+        self.client: httpx.AsyncClient | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stats = {"delivered": 0, "failed": 0, "errors": 0}
+
+    async def open(self) -> None:
+        self.client = httpx.AsyncClient(timeout=OUTBOX_TIMEOUT)
+        self._task = asyncio.create_task(self.run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                drained = await self.drain()
+            except Exception:
+                self._stats["errors"] += 1
+                drained = 0
+            if drained < self.batch_size:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+
+    async def cancel_payments(self, rows: list[dict]) -> None:
+        r = await self.client.post(
+            f"{PAYMENT_URL}/api/v1/payments/cancel",
+            json={"paymentUids": [str(row["payment_uid"]) for row in rows]},
+        )
+        r.raise_for_status()
+
+    async def apply_loyalty(self, rows: list[dict]) -> None:
+        r = await self.client.post(
+            f"{LOYALTY_URL}/api/v1/loyalty/batch",
+            json={"updates": [
+                {
+                    "username": row["username"],
+                    "delta": row["delta"],
+                    "idempotencyKey": f"cancel:{row['reservation_uid']}",
+                }
+                for row in rows
+            ]},
+        )
+        r.raise_for_status()
+
+    async def drain(self) -> int:
+        async with database.connection() as conn:
+            rows = await conn.fetch(CLAIM_OUTBOX, self.lease, self.batch_size)
+        if not rows:
+            return 0
+
+        handlers = {"PAYMENT_CANCEL": self.cancel_payments, "LOYALTY_DELTA": self.apply_loyalty}
+        batches = [(handler, [row for row in rows if row["kind"] == kind]) for kind, handler in handlers.items()]
+        batches = [(handler, batch) for handler, batch in batches if batch]
+        results = await asyncio.gather(*(handler(batch) for handler, batch in batches), return_exceptions=True)
+
+        async with database.connection() as conn:
+            for (_, batch), result in zip(batches, results):
+                ids = [row["id"] for row in batch]
+                if isinstance(result, Exception):
+                    self._stats["failed"] += len(ids)
+                    await conn.execute("""
+                        UPDATE outbox
+                        SET available_at = now() + make_interval(secs => LEAST(%s, power(2, attempts))),
+                            last_error = %s
+                        WHERE id = ANY(%s);
+                    """, self.max_backoff, repr(result), ids)
+                else:
+                    self._stats["delivered"] += len(ids)
+                    await conn.execute("DELETE FROM outbox WHERE id = ANY(%s);", ids)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {"running": self._task is not None and not self._task.done(), **self._stats}
+
+
+outbox_worker = OutboxWorker(OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_LEASE, OUTBOX_MAX_BACKOFF)
@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(
+            self,
+            dsn: str,
+            min_size: int = 1,
+            max_size: int = 10,
+            timeout: float = 5.0,
+            max_lifetime: float = 1800.0,
+            check_after: float = 30.0,
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        self._born: dict[int, float] = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+        }
+
+    def open(self) -> None:
+        with self._cond:
+            self._closed = False
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            conn = self._connect_reserved()
+            self._release_idle(conn)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            for conn, _ in idle:
+                self._born.pop(id(conn), None)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, idle_since = self._checkout(deadline)
+            if conn is None:
+                conn = self._connect_reserved()
+            elif not self._is_usable(conn, time.monotonic() - idle_since):
+                self._drop(conn)
+                continue
+            with self._cond:
+                self._stats["checkouts"] += 1
+            return conn
+
+    def putconn(self, conn) -> None:
+        if not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                pass
+
+        if conn.closed or self._closed:
+            self._drop(conn)
+            return
+        if self._expired(conn):
+            with self._cond:
+                self._stats["recycled"] += 1
+            self._drop(conn)
+            return
+
+        self._release_idle(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self._stats,
+            }
+
+    def _checkout(self, deadline: float):
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Пул соединений закрыт")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout("Не удалось получить соединение с БД")
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _connect_reserved(self):
+        try:
+            conn = psycopg2.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self._stats["created"] += 1
+        return conn
+
+    def _release_idle(self, conn) -> None:
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _drop(self, conn) -> None:
+        self._close(conn)
+        with self._cond:
+            self._born.pop(id(conn), None)
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    def _expired(self, conn) -> bool:
+        born = self._born.get(id(conn))
+        return born is not None and time.monotonic() - born > self.max_lifetime
+
+    def _is_usable(self, conn, idle_for: float) -> bool:
+        if conn.closed:
+            return False
+        if self._expired(conn):
+            with self._cond:
+                self._stats["recycled"] += 1
+            return False
+        if self.check_after <= 0 or idle_for < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
+
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag;
+"""
+
+
+class ReplicaSet:
+    def __init__(self, primary, replicas: list, max_lag: float, check_interval: float,
+                 sticky_for: float, sticky_size: int = 10000):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_for = sticky_for
+        self.sticky_size = sticky_size
+        self._healthy = [False] * len(replicas)
+        self._lag: list[float | None] = [None] * len(replicas)
+        self._next = 0
+        self._writes: OrderedDict[str, float] = OrderedDict()
+        self._monitor: asyncio.Task | None = None
+        self._stats = {"primary_reads": 0, "replica_reads": 0, "fallbacks": 0}
+
+    @property
+    def engine(self) -> str:
+        return self.primary.engine
+
+    async def open(self) -> None:
+        await self.primary.open()
+        for replica in self.replicas:
+            with suppress(Exception):
+                await replica.open()
+        if self.replicas:
+            await self.check_replicas()
+            self._monitor = asyncio.create_task(self.monitor())
+
+    async def close(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._monitor
+            self._monitor = None
+        for replica in self.replicas:
+            await replica.close()
+        await self.primary.close()
+
+    async def check_replicas(self) -> None:
+        for i, replica in enumerate(self.replicas):
+            try:
+                async with replica.connection() as conn:
+                    lag = float((await conn.fetchrow(LAG_QUERY))["lag"])
+            except Exception:
+                self._lag[i] = None
+                self._healthy[i] = False
+                continue
+            self._lag[i] = lag
+            self._healthy[i] = lag <= self.max_lag
+
+    async def monitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_replicas()
+
+    def mark_write(self, *users: str) -> None:
+        now = time.monotonic()
+        for user in users:
+            self._writes[user] = now
+            self._writes.move_to_end(user)
+        while len(self._writes) > self.sticky_size:
+            self._writes.popitem(last=False)
+
+    def wrote_recently(self, user: str) -> bool:
+        written = self._writes.get(user)
+        return written is not None and time.monotonic() - written < self.sticky_for
+
+    def mark_unhealthy(self, i: int) -> None:
+        self._healthy[i] = False
+        self._stats["fallbacks"] += 1
+
+    def pick_replica(self) -> int | None:
+        for _ in range(len(self.replicas)):
+            i = self._next % len(self.replicas)
+            self._next += 1
+            if self._healthy[i]:
+                return i
+        return None
+
+    @asynccontextmanager
+    async def connection(self, read_only: bool = False, user: str | None = None):
+        if not read_only and user is not None:
+            self.mark_write(user)
+
+        i = None
+        if read_only and not (user is not None and self.wrote_recently(user)):
+            i = self.pick_replica()
+
+        async with AsyncExitStack() as stack:
+            if i is None:
+                if read_only:
+                    self._stats["primary_reads"] += 1
+                conn = await stack.enter_async_context(self.primary.connection())
+            else:
+                try:
+                    conn = await stack.enter_async_context(self.replicas[i].connection())
+                    self._stats["replica_reads"] += 1
+                except Exception:
+                    self.mark_unhealthy(i)
+                    conn = await stack.enter_async_context(self.primary.connection())
+            yield conn
+
+    def stats(self) -> dict:
+        return {
+            **self.primary.stats(),
+            **self._stats,
+            "replicas": [
+                {"healthy": healthy, "lag": lag, **replica.stats()}
+                for replica, healthy, lag in zip(self.replicas, self._healthy, self._lag)
+            ],
+        }
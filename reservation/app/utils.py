@@ -1,7 +1,24 @@
+import base64
+import csv
+import io
+import json
 from typing import Dict, Any
 from uuid import UUID
 
 
+def encode_cursor(data: Dict[str, Any]) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(data, dict):
+        raise ValueError("cursor must encode an object")
+    return data
+
+
 def build_hotel_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "hotelUid": row["hotel_uid"],
@@ -44,3 +61,44 @@ def build_created_reservation_response(
         "status": row["status"],
         "paymentUid": str(payment_uid),
     }
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def is_exclusion_violation(error: Exception) -> bool:
+    code = getattr(error, "pgcode", None) or getattr(error, "sqlstate", None)
+    return code == "23P01"
+
+
+EXPORT_COLUMNS = ["reservationUid", "username", "hotelUid", "paymentUid", "status", "startDate", "endDate"]
+
+
+def build_export_row(row: tuple) -> list:
+    reservation_uid, username, hotel_uid, payment_uid, status, start_date, end_date = row
+    return [
+        str(reservation_uid),
+        username,
+        str(hotel_uid),
+        str(payment_uid),
+        status,
+        start_date.date().isoformat() if start_date else None,
+        end_date.date().isoformat() if end_date else None,
+    ]
+
+
+def encode_ndjson(rows: list[tuple]) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, build_export_row(row))), ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode()
+
+
+def encode_csv(rows: list[tuple], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(build_export_row(row) for row in rows)
+    return buffer.getvalue().encode()
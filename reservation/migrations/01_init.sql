@@ -1,4 +1,4 @@
-CREATE TABLE hotels
+CREATE TABLE IF NOT EXISTS hotels
 (
     id        SERIAL PRIMARY KEY,
     hotel_uid uuid         NOT NULL UNIQUE,
@@ -10,7 +10,7 @@ CREATE TABLE hotels
     price     INT          NOT NULL
 );
 
-CREATE TABLE reservation
+CREATE TABLE IF NOT EXISTS reservation
 (
     id              SERIAL PRIMARY KEY,
     reservation_uid uuid UNIQUE NOT NULL,
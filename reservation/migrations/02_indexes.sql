@@ -0,0 +1,4 @@
+CREATE INDEX IF NOT EXISTS idx_reservation_username ON reservation (username);
+CREATE INDEX IF NOT EXISTS idx_reservation_hotel_id ON reservation (hotel_id);
+CREATE UNIQUE INDEX IF NOT EXISTS hotels_hotel_uid_key ON hotels (hotel_uid);
+CREATE UNIQUE INDEX IF NOT EXISTS reservation_reservation_uid_key ON reservation (reservation_uid);
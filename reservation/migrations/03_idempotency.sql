@@ -0,0 +1,3 @@
+ALTER TABLE reservation ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+
+CREATE UNIQUE INDEX IF NOT EXISTS reservation_username_idempotency_key_key ON reservation (username, idempotency_key);
@@ -0,0 +1,8 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_hotels_name_trgm ON hotels USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_hotels_city_trgm ON hotels USING gin (city gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_hotels_city_price ON hotels (city, price);
+CREATE INDEX IF NOT EXISTS idx_hotels_country_city ON hotels (country, city);
+CREATE INDEX IF NOT EXISTS idx_hotels_stars_price ON hotels (stars, price);
+CREATE INDEX IF NOT EXISTS idx_hotels_price ON hotels (price);
@@ -0,0 +1,25 @@
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE reservation ADD COLUMN IF NOT EXISTS stay daterange;
+
+CREATE OR REPLACE FUNCTION reservation_set_stay() RETURNS trigger AS
+$$
+BEGIN
+    NEW.stay := daterange(NEW.start_date::date, NEW.end_date::date, '[)');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS reservation_stay ON reservation;
+CREATE TRIGGER reservation_stay
+    BEFORE INSERT OR UPDATE OF start_date, end_date
+    ON reservation
+    FOR EACH ROW
+EXECUTE FUNCTION reservation_set_stay();
+
+UPDATE reservation
+SET stay = daterange(start_date::date, end_date::date, '[)')
+WHERE stay IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_reservation_hotel_stay ON reservation USING gist (hotel_id, stay)
+    WHERE status <> 'CANCELED';
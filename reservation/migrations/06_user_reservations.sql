@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS idx_reservation_username_start ON reservation (username, start_date, id);
+
+DROP INDEX IF EXISTS idx_reservation_username;
@@ -0,0 +1,17 @@
+CREATE TABLE IF NOT EXISTS outbox
+(
+    id              BIGSERIAL PRIMARY KEY,
+    kind            VARCHAR(20) NOT NULL
+        CHECK (kind IN ('PAYMENT_CANCEL', 'LOYALTY_DELTA')),
+    reservation_uid UUID        NOT NULL,
+    payment_uid     UUID,
+    username        VARCHAR(80),
+    delta           INT,
+    attempts        INT         NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    available_at    TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    created_at      TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    UNIQUE (kind, reservation_uid)
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_available ON outbox (available_at, id);